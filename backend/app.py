@@ -14,24 +14,47 @@ import logging
 from threading import Thread
 from queue import Queue
 
+import click
 from flask import Flask, request, jsonify, g, Response
 from flask import send_from_directory
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, create_refresh_token, get_jwt_identity, get_jwt
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token, create_refresh_token, get_jwt_identity, get_jwt, current_user
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_mail import Mail, Message
 from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from models import db, User, Post, Comment, Tag, Category, Like, Favorite, Follow, Notification, ViewLog
+from models import db, User, Post, Comment, Tag, Category, Like, Favorite, Follow, Notification, NotificationFanoutJob, ViewLog
 from utils.validators import (
     validate_email, validate_password, validate_username, validate_post_title,
     validate_post_content, validate_tag_name, validate_category_name,
-    generate_excerpt, validate_slug, validate_comment_content
+    generate_excerpt, validate_slug, validate_comment_content, clean_search_query
 )
 from utils.auth import generate_confirmation_token, confirm_token
 from routes.posts import posts_bp
 from routes.auth import auth_bp
-from utils.renderer import render_markdown
+from utils.renderer import render_markdown, render_cache, render_many, render_pool_executor
+from utils.serializers import serialize_posts, serialize_comments
+from utils.author_stats import record_view_counts, record_view_logs, get_author_stats, rebuild_author_stats
+from utils.view_rollup import rollup_view_logs, purge_view_logs, query_trend
+from utils.counters import toggle_like, toggle_favorite, toggle_follow, increment
+from utils.trending import trending
+from utils.feed import feed_timeline
+from utils.user_cache import user_cache
+from utils.passwords import password_hasher
+from utils.rate_limit import rate_limiter
+from utils.bloom import account_filter
+from utils.view_counter import view_counter
+from utils.view_log import view_log_pipeline
+from utils.search import apply_search, ensure_search_index, rebuild_search_index
+from utils.suggestions import suggestion_index
+from utils.render_pool import render_pool
+from utils.notifications import (
+    notification_fanout, adjust_unread, get_unread_counts, mark_read, mark_all_read,
+    coalesce_notification, group_key_for, record_actor, archive_read_notifications
+)
+from utils.response_cache import response_cache
+from utils.pagination import cursor_requested, cursor_page, count_cache_key, InvalidCursor
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -52,6 +75,15 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
 app.config['PORT'] = int(os.environ.get('PORT', '5000'))
 
+# 反向代理层数（nginx 后部署为1），大于0时按 X-Forwarded-For / X-Forwarded-Proto 还原客户端地址
+app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+if app.config['TRUSTED_PROXY_COUNT'] > 0:
+    app.wsgi_app = ProxyFix(
+        app.wsgi_app,
+        x_for=app.config['TRUSTED_PROXY_COUNT'],
+        x_proto=app.config['TRUSTED_PROXY_COUNT']
+    )
+
 # CORS配置
 app.config['CORS_ORIGINS'] = os.environ.get('CORS_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
 app.config['CORS_SUPPORTS_CREDENTIALS'] = False
@@ -67,8 +99,128 @@ app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'norep
 # SocketIO配置
 app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('REDIS_URL', None)
 
+# 浏览量写缓冲配置
+app.config['VIEW_COUNT_FLUSH_INTERVAL'] = float(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', '10'))
+app.config['VIEW_COUNT_FLUSH_THRESHOLD'] = int(os.environ.get('VIEW_COUNT_FLUSH_THRESHOLD', '500'))
+app.config['VIEW_COUNT_BACKEND'] = os.environ.get('VIEW_COUNT_BACKEND', 'memory')  # memory, redis
+app.config['VIEW_COUNT_REDIS_URL'] = os.environ.get('REDIS_URL', None)
+
+# 全文检索配置（关闭后回退到LIKE查询）
+app.config['SEARCH_FULLTEXT'] = os.environ.get('SEARCH_FULLTEXT', 'true').lower() == 'true'
+
+# 搜索建议索引的全量重建间隔（秒，0为不重建）；索引在每个进程内，多worker部署时靠重建同步其他进程的写入
+app.config['SUGGESTION_REFRESH_INTERVAL'] = int(os.environ.get('SUGGESTION_REFRESH_INTERVAL', '300'))
+
+# Markdown渲染缓存配置（RENDER_CACHE_DIR 为空时只用内存缓存）
+app.config['RENDER_CACHE_SIZE'] = int(os.environ.get('RENDER_CACHE_SIZE', '2048'))
+app.config['RENDER_CACHE_DIR'] = os.environ.get('RENDER_CACHE_DIR', '')
+
+# 大文章异步渲染配置（正文字符数超过阈值时交给进程池）
+app.config['RENDER_ASYNC_THRESHOLD'] = int(os.environ.get('RENDER_ASYNC_THRESHOLD', '20000'))
+app.config['RENDER_TIMEOUT'] = float(os.environ.get('RENDER_TIMEOUT', '30'))
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', '2'))
+
+# 关注者通知扇出配置（每批插入的通知数）
+app.config['NOTIFICATION_FANOUT_CHUNK_SIZE'] = int(os.environ.get('NOTIFICATION_FANOUT_CHUNK_SIZE', '1000'))
+# 扇出失败批次的最大尝试次数和重试间隔（秒，按次数递增）
+app.config['NOTIFICATION_FANOUT_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFICATION_FANOUT_MAX_ATTEMPTS', '3'))
+app.config['NOTIFICATION_FANOUT_RETRY_DELAY'] = float(os.environ.get('NOTIFICATION_FANOUT_RETRY_DELAY', '2'))
+
+# 通知合并窗口和合并通知的推送间隔（秒，窗口为0时不合并）
+app.config['NOTIFICATION_COALESCE_WINDOW'] = int(os.environ.get('NOTIFICATION_COALESCE_WINDOW', '3600'))
+app.config['NOTIFICATION_PUSH_INTERVAL'] = int(os.environ.get('NOTIFICATION_PUSH_INTERVAL', '10'))
+
+# 通知保留期：已读通知超过天数后归档（archive）或删除（delete）
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+app.config['NOTIFICATION_RETENTION_MODE'] = os.environ.get('NOTIFICATION_RETENTION_MODE', 'archive')
+app.config['NOTIFICATION_RETENTION_BATCH_SIZE'] = int(os.environ.get('NOTIFICATION_RETENTION_BATCH_SIZE', '1000'))
+
+# 首页关注流（每人保留条数、改为读取时拉取的粉丝数阈值、关注后补入的文章数）
+app.config['FEED_MAX_ENTRIES'] = int(os.environ.get('FEED_MAX_ENTRIES', '500'))
+app.config['FEED_PULL_THRESHOLD'] = int(os.environ.get('FEED_PULL_THRESHOLD', '10000'))
+app.config['FEED_BACKFILL_SIZE'] = int(os.environ.get('FEED_BACKFILL_SIZE', '20'))
+
+# JWT身份解析的用户快照缓存（秒数、最大条数，TTL为0时不缓存）
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', '30'))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+
+# 密码哈希（werkzeug哈希方法和盐长度，修改后用户登录时自动重新哈希）
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('PASSWORD_SALT_LENGTH', '16'))
+
+# 密码哈希进程池（进程数为0时在请求线程中同步计算；排队上限；等待秒数）
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+app.config['PASSWORD_HASH_QUEUE_SIZE'] = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', '32'))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+
+# 登录等接口限流（memory 或 redis；规则为 次数/窗口，ACCOUNT 为按账号计数，其余按IP计数）
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get('REDIS_URL', None)
+app.config['RATE_LIMIT_LOGIN'] = os.environ.get('RATE_LIMIT_LOGIN', '20/minute')
+app.config['RATE_LIMIT_LOGIN_ACCOUNT'] = os.environ.get('RATE_LIMIT_LOGIN_ACCOUNT', '5/minute')
+app.config['RATE_LIMIT_FORGOT_PASSWORD'] = os.environ.get('RATE_LIMIT_FORGOT_PASSWORD', '10/hour')
+app.config['RATE_LIMIT_FORGOT_PASSWORD_ACCOUNT'] = os.environ.get('RATE_LIMIT_FORGOT_PASSWORD_ACCOUNT', '3/hour')
+app.config['RATE_LIMIT_CHECK_USERNAME'] = os.environ.get('RATE_LIMIT_CHECK_USERNAME', '60/minute')
+app.config['RATE_LIMIT_CHECK_EMAIL'] = os.environ.get('RATE_LIMIT_CHECK_EMAIL', '60/minute')
+
+# 注册可用性检查的布隆过滤器（初始容量、误判率、重建间隔秒数，0表示只在启动时构建）
+app.config['ACCOUNT_FILTER_CAPACITY'] = int(os.environ.get('ACCOUNT_FILTER_CAPACITY', '100000'))
+app.config['ACCOUNT_FILTER_ERROR_RATE'] = float(os.environ.get('ACCOUNT_FILTER_ERROR_RATE', '0.01'))
+app.config['ACCOUNT_FILTER_REBUILD_INTERVAL'] = int(os.environ.get('ACCOUNT_FILTER_REBUILD_INTERVAL', '3600'))
+
+# 匿名只读接口响应缓存（memory 或 redis）
+app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', '60'))
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', '1000'))
+app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+app.config['RESPONSE_CACHE_REDIS_URL'] = os.environ.get('REDIS_URL', None)
+
+# 浏览日志异步写入配置
+app.config['VIEW_LOG_QUEUE_SIZE'] = int(os.environ.get('VIEW_LOG_QUEUE_SIZE', '10000'))
+app.config['VIEW_LOG_BATCH_SIZE'] = int(os.environ.get('VIEW_LOG_BATCH_SIZE', '200'))
+app.config['VIEW_LOG_FLUSH_INTERVAL'] = float(os.environ.get('VIEW_LOG_FLUSH_INTERVAL', '2'))
+
+# 浏览日志汇总与保留期（天）
+app.config['VIEW_LOG_RETENTION_DAYS'] = int(os.environ.get('VIEW_LOG_RETENTION_DAYS', '30'))
+app.config['VIEW_ROLLUP_HOURLY_RETENTION_DAYS'] = int(os.environ.get('VIEW_ROLLUP_HOURLY_RETENTION_DAYS', '90'))
+# 只汇总浏览时间早于该秒数的记录，需大于浏览日志从记录到提交的最长耗时
+app.config['VIEW_ROLLUP_SAFETY_LAG'] = int(os.environ.get('VIEW_ROLLUP_SAFETY_LAG', '300'))
+
+# 热门文章排行（衰减指数、排行长度、刷新间隔秒数、快照文件）
+app.config['TRENDING_GRAVITY'] = float(os.environ.get('TRENDING_GRAVITY', '1.8'))
+app.config['TRENDING_SIZE'] = int(os.environ.get('TRENDING_SIZE', '200'))
+app.config['TRENDING_REFRESH_INTERVAL'] = int(os.environ.get('TRENDING_REFRESH_INTERVAL', '300'))
+app.config['TRENDING_SNAPSHOT_PATH'] = (
+    os.environ.get('TRENDING_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'trending.json')
+)
+
 # 初始化扩展
 db.init_app(app)
+view_counter.init_app(app)
+view_log_pipeline.init_app(app)
+render_cache.configure(
+    max_entries=app.config['RENDER_CACHE_SIZE'],
+    cache_dir=app.config['RENDER_CACHE_DIR'] or None
+)
+render_pool.init_app(app)
+response_cache.init_app(app)
+trending.init_app(app)
+feed_timeline.init_app(app)
+user_cache.init_app(app)
+password_hasher.init_app(app)
+rate_limiter.init_app(app)
+account_filter.init_app(app)
+suggestion_index.init_app(app)
+
+# 浏览量写回后同步搜索建议的热度
+@view_counter.on_flush
+def sync_suggestion_weights(counts):
+    suggestion_index.add_weight('post', counts)
+
+# 浏览量和浏览日志写回后累加作者统计
+view_counter.on_flush(record_view_counts)
+view_log_pipeline.on_write(record_view_logs)
 jwt = JWTManager(app)
 mail = Mail(app)
 
@@ -100,7 +252,7 @@ def get_my_posts():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    posts = [p.to_dict(include_content=False) for p in pagination.items]
+    posts = serialize_posts(pagination.items)
     return jsonify({
         'posts': posts,
         'pagination': {
@@ -113,9 +265,33 @@ def get_my_posts():
         }
     })
 
+# 首页关注流
+@app.route('/api/feed', methods=['GET'])
+@jwt_required()
+def get_feed():
+    """获取关注作者的文章（游标分页）"""
+    current_user_id = get_jwt_identity()
+    per_page = min(request.args.get('per_page', 10, type=int), 50)
+    try:
+        posts, next_cursor = feed_timeline.read(current_user_id, request.args.get('cursor', ''), per_page)
+    except InvalidCursor:
+        return jsonify({'message': '分页游标无效', 'error': 'invalid_cursor'}), 400
+    return jsonify({
+        'posts': serialize_posts(posts),
+        'pagination': {
+            'per_page': per_page,
+            'has_next': next_cursor is not None,
+            'next_cursor': next_cursor
+        }
+    })
+
 # 全局变量存储在线用户
 online_users = {}
 notification_queue = Queue()
+notification_fanout.init_app(app, online_users=online_users, socketio=socketio)
+
+# 发布文章扇出通知时，同批写入关注者的首页关注流
+notification_fanout.on_chunk(feed_timeline.push)
 
 # JWT回调函数
 @jwt.user_identity_loader
@@ -125,7 +301,7 @@ def user_identity_lookup(user):
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
     identity = jwt_data["sub"]
-    return User.query.get(identity)
+    return user_cache.get(identity)
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_data):
@@ -189,7 +365,19 @@ def send_email(subject, recipients, body, html_body=None):
     Thread(target=send_async_email, args=(app, msg)).start()
 
 def create_notification(user_id, type, title, message, actor_id=None, post_id=None, comment_id=None, extra_data=None):
-    """创建通知"""
+    """创建通知，窗口内同一目标的同类通知合并为一条"""
+    merged, push = coalesce_notification(
+        user_id, type, actor_id=actor_id, post_id=post_id, comment_id=comment_id,
+        window=app.config['NOTIFICATION_COALESCE_WINDOW'],
+        push_interval=app.config['NOTIFICATION_PUSH_INTERVAL']
+    )
+    if merged is not None:
+        db.session.commit()
+        # 合并不改变未读数，只按间隔推送更新后的通知
+        if push and str(user_id) in online_users:
+            socketio.emit('notification_updated', merged.to_dict(), room=f"user_{user_id}")
+        return merged
+    
     notification = Notification(
         user_id=user_id,
         type=type,
@@ -198,14 +386,20 @@ def create_notification(user_id, type, title, message, actor_id=None, post_id=No
         actor_id=actor_id,
         post_id=post_id,
         comment_id=comment_id,
+        group_key=group_key_for(type, post_id),
         data=json.dumps(extra_data) if extra_data else None
     )
     db.session.add(notification)
+    adjust_unread([user_id])
+    if notification.group_key:
+        db.session.flush()
+        record_actor(notification.id, actor_id)
     db.session.commit()
     
-    # 通过WebSocket发送实时通知
+    # 通过WebSocket发送实时通知和最新未读数
     if str(user_id) in online_users:
         socketio.emit('new_notification', notification.to_dict(), room=f"user_{user_id}")
+        notification_fanout.push_unread([user_id])
     
     return notification
 
@@ -246,6 +440,10 @@ def handle_user_online(data):
     
     logger.info(f"User {user_id} is online")
     broadcast_online_count()
+    
+    # 上线时下发当前未读数，之后随变化推送
+    if user_id.isdigit():
+        emit('unread_count', {'count': get_unread_counts([int(user_id)]).get(int(user_id), 0)})
 
 @socketio.on('join_post')
 def handle_join_post(data):
@@ -287,23 +485,25 @@ def handle_stop_typing(data):
 
 # API路由 - 文章相关
 @app.route('/api/posts', methods=['GET'])
+@response_cache.cached(groups=('posts',))
 def get_posts():
     """获取文章列表"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    search = request.args.get('search', '').strip()
+    search = clean_search_query(request.args.get('search', ''))
     tag = request.args.get('tag', '').strip()
     category = request.args.get('category', '').strip()
     author = request.args.get('author', '').strip()
-    sort_by = request.args.get('sort_by', 'created_at')
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'created_at')
     order = request.args.get('order', 'desc')
     
     # 基础查询
     query = Post.query.filter_by(status='published')
     
-    # 搜索过滤
+    # 搜索过滤（全文索引，按相关度排序）
+    relevance = None
     if search:
-        query = query.filter(Post.title.contains(search) | Post.content.contains(search))
+        query, relevance = apply_search(query, search, fields=(Post.title, Post.content))
     
     if tag:
         query = query.join(Post.tags).filter(Tag.slug == tag)
@@ -324,7 +524,25 @@ def get_posts():
     else:
         sort_field = Post.created_at
     
-    if order == 'asc':
+    # 游标分页（按排序字段+ID定位，相关度排序时按创建时间）
+    if cursor_requested(request.args):
+        try:
+            posts, pagination_data = cursor_page(
+                query, sort_field, Post.id, request.args, per_page,
+                sort_key=f'{sort_field.key}:{order}',
+                descending=order != 'asc',
+                count_key=count_cache_key('posts', request.args)
+            )
+        except InvalidCursor:
+            return jsonify({'message': '分页游标无效', 'error': 'invalid_cursor'}), 400
+        return jsonify({
+            'posts': serialize_posts(posts),
+            'pagination': pagination_data
+        })
+    
+    if relevance is not None and sort_by == 'relevance':
+        query = query.order_by(relevance, Post.created_at.desc())
+    elif order == 'asc':
         query = query.order_by(sort_field.asc())
     else:
         query = query.order_by(sort_field.desc())
@@ -334,7 +552,7 @@ def get_posts():
     posts = pagination.items
     
     return jsonify({
-        'posts': [post.to_dict(include_content=False) for post in posts],
+        'posts': serialize_posts(posts),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -345,24 +563,6 @@ def get_posts():
         }
     })
 
-@app.route('/api/posts/<int:post_id>', methods=['GET'])
-def get_post(post_id):
-    """获取单篇文章详情"""
-    post = Post.query.get_or_404(post_id)
-    
-    if post.status != 'published':
-        current_user_id = get_jwt_identity() if request.headers.get('Authorization') else None
-        # 检查是否有权限查看草稿
-        if not current_user_id or post.author_id != current_user_id:
-            return jsonify({'message': '文章不存在或无权限查看', 'error': 'access_denied'}), 404
-    
-    # 增加浏览次数
-    # 增加浏览次数
-    post.increment_view_count()
-    
-    # 记录浏览日志
-    user_id = get_jwt_identity() if request.headers.get('Authorization') else None
-
 @app.route('/api/posts', methods=['POST'])
 @jwt_required()
 def create_post():
@@ -401,7 +601,6 @@ def create_post():
         title=title,
         slug=slug,
         content=content,
-        content_html=render_markdown(content),
         summary=summary or generate_excerpt(content),
         status=status,
         allow_comments=allow_comments,
@@ -411,6 +610,9 @@ def create_post():
     if status == 'published':
         post.published_at = datetime.now(timezone.utc)
     
+    # 大文章提交后交给进程池渲染
+    render_async = render_pool.prepare(post, content)
+    
 
     db.session.add(post)
 
@@ -438,21 +640,21 @@ def create_post():
     
     
     
-    # 更新用户的文章计数
-    user = User.query.get(current_user_id)
-    user.posts_count += 1
+    # 更新用户的文章计数（原子自增，不加载用户行）
+    increment(User.posts_count, current_user_id, 1)
     
     db.session.commit()
     
-    # 通知关注者
-    followers = user.followers.all()
-    for follower in followers:
-        create_notification(
-            user_id=follower.id,
+    if render_async:
+        render_pool.submit(post.id, content)
+    
+    # 通知关注者（后台批量扇出）
+    if status == 'published':
+        notification_fanout.notify_followers(
+            author_id=current_user.id,
             type='new_post',
             title='新文章发布',
-            message=f'{user.nickname or user.username} 发布了新文章《{post.title}》',
-            actor_id=user.id,
+            message=f'{current_user.nickname or current_user.username} 发布了新文章《{post.title}》',
             post_id=post.id
         )
     
@@ -473,6 +675,8 @@ def update_post(post_id):
         return jsonify({'message': '无权限编辑此文章', 'error': 'access_denied'}), 403
     
     data = request.get_json()
+    render_async = False
+    first_published = False
     
     # 更新字段
     if 'title' in data:
@@ -486,7 +690,7 @@ def update_post(post_id):
         if not validate_post_content(content):
             return jsonify({'message': '内容长度不能少于10个字符', 'error': 'invalid_content'}), 400
         post.content = content
-        post.content_html = render_markdown(content)
+        render_async = render_pool.prepare(post, content)
         post.summary = generate_excerpt(content)
 
     if 'summary' in data:
@@ -501,12 +705,27 @@ def update_post(post_id):
             post.status = new_status
             if new_status == 'published' and not post.published_at:
                 post.published_at = datetime.now(timezone.utc)
+                first_published = True
         else:
             return jsonify({'message': '文章状态无效', 'error': 'invalid_status'}), 400
     
     post.updated_at = datetime.now(timezone.utc)
     db.session.commit()
     
+    if render_async:
+        render_pool.submit(post.id, post.content)
+    
+    # 草稿首次发布时通知关注者并写入关注流（后台批量扇出）
+    if first_published:
+        author = post.author
+        notification_fanout.notify_followers(
+            author_id=author.id,
+            type='new_post',
+            title='新文章发布',
+            message=f'{author.nickname or author.username} 发布了新文章《{post.title}》',
+            post_id=post.id
+        )
+    
     return jsonify({
         'message': '文章更新成功',
         'post': post.to_dict()
@@ -526,8 +745,7 @@ def delete_post(post_id):
     db.session.delete(post)
     
     # 更新用户的文章计数
-    user = User.query.get(current_user_id)
-    user.posts_count -= 1
+    increment(User.posts_count, current_user_id, -1)
     
     db.session.commit()
     
@@ -540,18 +758,36 @@ def get_post_comments(post_id):
     post = Post.query.get_or_404(post_id)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    replies_limit = min(max(request.args.get('replies', 5, type=int), 0), 20)
     
     # 只显示已批准的评论
-    comments = Comment.query.filter_by(
+    query = Comment.query.filter_by(
         post_id=post_id,
         parent_id=None,  # 顶级评论
         status='approved'
-    ).order_by(Comment.created_at.desc()).paginate(
+    )
+    
+    # 游标分页
+    if cursor_requested(request.args):
+        try:
+            items, pagination_data = cursor_page(
+                query, Comment.created_at, Comment.id, request.args, per_page,
+                sort_key='created_at:desc',
+                count_key=count_cache_key('comments', request.args, post_id)
+            )
+        except InvalidCursor:
+            return jsonify({'message': '分页游标无效', 'error': 'invalid_cursor'}), 400
+        return jsonify({
+            'comments': serialize_comments(items, replies_limit),
+            'pagination': pagination_data
+        })
+    
+    comments = query.order_by(Comment.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
     return jsonify({
-        'comments': [comment.to_dict() for comment in comments.items],
+        'comments': serialize_comments(comments.items, replies_limit),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -562,6 +798,28 @@ def get_post_comments(post_id):
         }
     })
 
+@app.route('/api/comments/<int:comment_id>/replies', methods=['GET'])
+def get_comment_replies(comment_id):
+    """分页获取某条评论的回复（按时间正序，游标分页）"""
+    comment = Comment.query.get_or_404(comment_id)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    
+    query = Comment.query.filter_by(parent_id=comment.id, status='approved')
+    try:
+        items, pagination_data = cursor_page(
+            query, Comment.created_at, Comment.id, request.args, per_page,
+            sort_key='created_at:asc',
+            descending=False,
+            count_key=count_cache_key('replies', request.args, comment.id)
+        )
+    except InvalidCursor:
+        return jsonify({'message': '分页游标无效', 'error': 'invalid_cursor'}), 400
+    
+    return jsonify({
+        'replies': serialize_comments(items, replies_per_comment=0),
+        'pagination': pagination_data
+    })
+
 @app.route('/api/posts/<int:post_id>/comments', methods=['POST'])
 @jwt_required()
 def create_comment(post_id):
@@ -644,44 +902,28 @@ def like_post(post_id):
     """点赞文章"""
     post = Post.query.get_or_404(post_id)
     current_user_id = get_jwt_identity()
+    post_author_id = post.author_id
+    post_title = post.title
     
-    # 检查是否已经点赞
-    existing_like = Like.query.filter_by(
-        user_id=current_user_id,
-        post_id=post_id
-    ).first()
-    
-    if existing_like:
-        # 取消点赞
-        db.session.delete(existing_like)
-        post.like_count -= 1
-        message = '已取消点赞'
-        liked = False
-    else:
-        # 添加点赞
-        like = Like(user_id=current_user_id, post_id=post_id)
-        db.session.add(like)
-        post.like_count += 1
-        message = '点赞成功'
-        liked = True
-        
-        # 创建通知（如果不是自己的文章）
-        if post.author_id != current_user_id:
-            create_notification(
-                user_id=post.author_id,
-                type='like',
-                title='文章被点赞',
-                message=f'有人点赞了你的文章《{post.title}》',
-                actor_id=current_user_id,
-                post_id=post_id
-            )
+    # 已点赞则取消，否则点赞；关系增删和计数更新在同一个短事务中原子完成
+    liked, like_count = toggle_like(current_user_id, post)
+    message = '点赞成功' if liked else '已取消点赞'
     
-    db.session.commit()
+    # 创建通知（如果不是自己的文章）
+    if liked and post_author_id != current_user_id:
+        create_notification(
+            user_id=post_author_id,
+            type='like',
+            title='文章被点赞',
+            message=f'有人点赞了你的文章《{post_title}》',
+            actor_id=current_user_id,
+            post_id=post_id
+        )
     
     return jsonify({
         'message': message,
         'liked': liked,
-        'like_count': post.like_count
+        'like_count': like_count
     })
 
 @app.route('/api/posts/<int:post_id>/favorite', methods=['POST'])
@@ -691,32 +933,14 @@ def favorite_post(post_id):
     post = Post.query.get_or_404(post_id)
     current_user_id = get_jwt_identity()
     
-    # 检查是否已经收藏
-    existing_favorite = Favorite.query.filter_by(
-        user_id=current_user_id,
-        post_id=post_id
-    ).first()
-    
-    if existing_favorite:
-        # 取消收藏
-        db.session.delete(existing_favorite)
-        post.favorite_count -= 1
-        message = '已取消收藏'
-        favorited = False
-    else:
-        # 添加收藏
-        favorite = Favorite(user_id=current_user_id, post_id=post_id)
-        db.session.add(favorite)
-        post.favorite_count += 1
-        message = '收藏成功'
-        favorited = True
-    
-    db.session.commit()
+    # 已收藏则取消，否则收藏（原子切换）
+    favorited, favorite_count = toggle_favorite(current_user_id, post)
+    message = '收藏成功' if favorited else '已取消收藏'
     
     return jsonify({
         'message': message,
         'favorited': favorited,
-        'favorite_count': post.favorite_count
+        'favorite_count': favorite_count
     })
 
 @app.route('/api/users/<int:user_id>/follow', methods=['POST'])
@@ -729,34 +953,30 @@ def follow_user(user_id):
     if current_user_id == user_id:
         return jsonify({'message': '不能关注自己', 'error': 'self_follow'}), 400
     
-    current_user = User.query.get(current_user_id)
+    actor_name = current_user.nickname or current_user.username
     
-    if current_user.is_following(user_to_follow):
-        # 取消关注
-        current_user.unfollow(user_to_follow)
-        message = '已取消关注'
-        following = False
-    else:
-        # 关注用户
-        current_user.follow(user_to_follow)
-        message = '关注成功'
-        following = True
-        
+    # 已关注则取消，否则关注（原子切换）
+    following, followers_count = toggle_follow(current_user_id, user_id)
+    message = '关注成功' if following else '已取消关注'
+    
+    if following:
         # 创建通知
         create_notification(
             user_id=user_id,
             type='follow',
             title='新粉丝',
-            message=f'{current_user.nickname or current_user.username} 关注了你',
+            message=f'{actor_name} 关注了你',
             actor_id=current_user_id
         )
-    
-    db.session.commit()
+        # 补入作者近期文章到首页关注流
+        feed_timeline.backfill(current_user_id, user_id)
+    else:
+        feed_timeline.remove_author(current_user_id, user_id)
     
     return jsonify({
         'message': message,
         'following': following,
-        'followers_count': user_to_follow.followers_count
+        'followers_count': followers_count
     })
 
 # API路由 - 通知相关
@@ -774,7 +994,24 @@ def get_notifications():
     if unread_only:
         query = query.filter_by(is_read=False)
     
-    notifications = query.order_by(Notification.created_at.desc()).paginate(
+    # 游标分页
+    if cursor_requested(request.args):
+        try:
+            items, pagination_data = cursor_page(
+                query, Notification.updated_at, Notification.id, request.args, per_page,
+                sort_key='updated_at:desc',
+                count_key=count_cache_key('notifications', request.args, current_user_id)
+            )
+        except InvalidCursor:
+            return jsonify({'message': '分页游标无效', 'error': 'invalid_cursor'}), 400
+        return jsonify({
+            'notifications': [n.to_dict() for n in items],
+            'pagination': pagination_data,
+            'unread_count': get_unread_counts([current_user_id]).get(current_user_id, 0)
+        })
+    
+    # 按最近一次更新排序，合并了新触发者的通知排到前面
+    notifications = query.order_by(Notification.updated_at.desc(), Notification.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
@@ -788,7 +1025,7 @@ def get_notifications():
             'has_prev': notifications.has_prev,
             'has_next': notifications.has_next
         },
-        'unread_count': Notification.query.filter_by(user_id=current_user_id, is_read=False).count()
+        'unread_count': get_unread_counts([current_user_id]).get(current_user_id, 0)
     })
 
 @app.route('/api/notifications/<int:notification_id>/read', methods=['PUT'])
@@ -801,49 +1038,105 @@ def mark_notification_read(notification_id):
     if notification.user_id != current_user_id:
         return jsonify({'message': '无权限', 'error': 'access_denied'}), 403
     
-    notification.is_read = True
-    db.session.commit()
+    if mark_read(current_user_id, notification_id):
+        notification_fanout.push_unread([current_user_id])
     
     return jsonify({'message': '已标记为已读'})
 
+@app.route('/api/notifications/read-all', methods=['PUT'])
+@jwt_required()
+def mark_all_notifications_read():
+    """把全部通知标记为已读"""
+    current_user_id = get_jwt_identity()
+    count = mark_all_read(current_user_id)
+    if count:
+        notification_fanout.push_unread([current_user_id])
+    
+    return jsonify({'message': '已全部标记为已读', 'count': count})
+
 # API路由 - 数据统计
 @app.route('/api/stats/dashboard', methods=['GET'])
 @jwt_required()
 def get_dashboard_stats():
     """获取仪表板统计数据"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    # 基本统计
-    stats = {
-        'total_posts': Post.query.filter_by(author_id=current_user_id).count(),
-        'total_views': db.session.query(db.func.sum(Post.view_count)).filter_by(author_id=current_user_id).scalar() or 0,
-        'total_likes': db.session.query(db.func.sum(Post.like_count)).filter_by(author_id=current_user_id).scalar() or 0,
-        'total_comments': Comment.query.join(Post).filter(Post.author_id == current_user_id).count(),
-        'unread_notifications': Notification.query.filter_by(user_id=current_user_id, is_read=False).count(),
-        'followers_count': user.followers_count,
-        'following_count': user.following_count
-    }
+    # 计数不在身份快照中，只查询需要的列
+    counts = db.session.query(
+        User.unread_notifications_count, User.followers_count, User.following_count
+    ).filter(User.id == current_user.id).one()
+    
+    # 汇总数据来自物化统计表，按主键读取
+    totals, view_trend = get_author_stats(current_user_id, days=7)
+    stats = dict(
+        totals,
+        unread_notifications=max(counts.unread_notifications_count or 0, 0),
+        followers_count=counts.followers_count,
+        following_count=counts.following_count
+    )
     
     # 最近7天的文章浏览量
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=7)
+    stats['view_trend'] = view_trend
     
-    view_stats = db.session.query(
-        db.func.date(ViewLog.viewed_at).label('date'),
-        db.func.count(ViewLog.id).label('views')
-    ).join(Post).filter(
-        Post.author_id == current_user_id,
-        ViewLog.viewed_at >= start_date,
-        ViewLog.viewed_at <= end_date
-    ).group_by(db.func.date(ViewLog.viewed_at)).all()
+    return jsonify(stats)
+
+@app.route('/api/stats/views/trend', methods=['GET'])
+@jwt_required()
+def get_view_trend():
+    """按时间段查询浏览趋势（数据来自浏览汇总表）"""
+    current_user_id = int(get_jwt_identity())
+    post_id = request.args.get('post_id', type=int)
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return jsonify({'message': '统计粒度只能是 hour 或 day', 'error': 'invalid_granularity'}), 400
+    
+    try:
+        now = datetime.utcnow()
+        start_arg = request.args.get('start')
+        end_arg = request.args.get('end')
+        start = datetime.fromisoformat(start_arg) if start_arg else now - timedelta(days=30)
+        end = datetime.fromisoformat(end_arg) if end_arg else now
+        if end_arg and len(end_arg) == 10:
+            end += timedelta(days=1)  # 只给日期时包含当天
+        # 带时区偏移的输入先换算为UTC，汇总桶按UTC存储
+        if start.tzinfo is not None:
+            start = start.astimezone(timezone.utc).replace(tzinfo=None)
+        if end.tzinfo is not None:
+            end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        return jsonify({'message': '日期格式无效', 'error': 'invalid_date_range'}), 400
+    max_days = 31 if granularity == 'hour' else 3660
+    if start >= end or end - start > timedelta(days=max_days):
+        return jsonify({'message': f'时间范围无效或超过{max_days}天', 'error': 'invalid_date_range'}), 400
     
-    stats['view_trend'] = [{'date': str(item.date), 'views': item.views} for item in view_stats]
+    if post_id:
+        post = Post.query.get_or_404(post_id)
+        if post.author_id != current_user_id and not current_user.is_admin:
+            return jsonify({'message': '无权限', 'error': 'access_denied'}), 403
+        post_ids = [post.id]
+    else:
+        post_ids = [row.id for row in db.session.query(Post.id).filter_by(author_id=current_user_id)]
     
-    return jsonify(stats)
+    return jsonify(dict(
+        query_trend(post_ids, start, end, granularity),
+        granularity=granularity,
+        start=start.isoformat(),
+        end=end.isoformat()
+    ))
+
+@app.route('/api/stats/ingestion', methods=['GET'])
+@jwt_required()
+def get_ingestion_stats():
+    """获取浏览日志管道的运行指标（管理员）"""
+    if not current_user.is_admin:
+        return jsonify({'message': '无权限', 'error': 'access_denied'}), 403
+    
+    return jsonify({
+        'view_logs': view_log_pipeline.stats()
+    })
 
 
 @app.route('/api/rss', methods=['GET'])
+@response_cache.cached(groups=('posts',))
 def rss_feed():
     """输出最新文章的RSS订阅源"""
     base_url = request.url_root.rstrip('/')
@@ -893,6 +1186,8 @@ def serve_uploads(filename):
 def init_db():
     """初始化数据库"""
     db.create_all()
+    ensure_search_index()
+    account_filter.request_rebuild()
     
     # 创建默认管理员用户
     admin_user = User.query.filter_by(username='admin').first()
@@ -914,6 +1209,102 @@ def init_db():
     
     print('Database initialized successfully!')
 
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """重建文章全文检索索引"""
+    count = rebuild_search_index()
+    print(f'Indexed {count} posts')
+
+@app.cli.command('rebuild-author-stats')
+def rebuild_author_stats_command():
+    """按源数据重建作者统计物化表"""
+    count = rebuild_author_stats()
+    print(f'Rebuilt stats for {count} authors')
+
+@app.cli.command('rollup-views')
+@click.option('--batch-size', default=5000, type=int, help='每批汇总的浏览记录数')
+@click.option('--purge/--no-purge', default=True, help='汇总后删除超过保留期的原始记录和小时桶')
+def rollup_views_command(batch_size, purge):
+    """把浏览日志汇总为小时桶和天桶，并执行保留策略（建议由cron定期运行，浏览趋势和热门周榜/月榜读取汇总表）"""
+    count = rollup_view_logs(batch_size=batch_size, safety_lag=app.config['VIEW_ROLLUP_SAFETY_LAG'])
+    print(f'Rolled up {count} view logs')
+    if purge:
+        raw_deleted, hourly_deleted = purge_view_logs(
+            app.config['VIEW_LOG_RETENTION_DAYS'],
+            app.config['VIEW_ROLLUP_HOURLY_RETENTION_DAYS']
+        )
+        print(f'Purged {raw_deleted} raw view logs and {hourly_deleted} hourly buckets')
+
+@app.cli.command('archive-notifications')
+@click.option('--days', default=None, type=int, help='保留天数，默认 NOTIFICATION_RETENTION_DAYS')
+@click.option('--mode', default=None, type=click.Choice(['archive', 'delete']), help='默认 NOTIFICATION_RETENTION_MODE')
+@click.option('--batch-size', default=None, type=int, help='每批处理的通知数')
+@click.option('--max-batches', default=None, type=int, help='本次最多处理的批数')
+@click.option('--pause', default=0.0, type=float, help='两批之间的休眠秒数')
+def archive_notifications_command(days, mode, batch_size, max_batches, pause):
+    """把超过保留期的已读通知分批归档或删除（建议由cron定期运行）"""
+    stats = archive_read_notifications(
+        days if days is not None else app.config['NOTIFICATION_RETENTION_DAYS'],
+        mode=mode or app.config['NOTIFICATION_RETENTION_MODE'],
+        batch_size=batch_size or app.config['NOTIFICATION_RETENTION_BATCH_SIZE'],
+        max_batches=max_batches,
+        pause=pause
+    )
+    print(json.dumps(stats))
+
+@app.cli.command('resume-fanout')
+@click.option('--include-failed/--pending-only', default=True, help='是否同时重新执行重试耗尽的任务')
+def resume_fanout_command(include_failed):
+    """在当前进程中执行未完成的关注者通知扇出任务"""
+    statuses = ['pending', 'failed'] if include_failed else ['pending']
+    job_ids = [row.id for row in db.session.query(NotificationFanoutJob.id).filter(
+        NotificationFanoutJob.status.in_(statuses)
+    ).order_by(NotificationFanoutJob.id).all()]
+    total = 0
+    for job_id in job_ids:
+        try:
+            total += notification_fanout.fanout(job_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f'Fanout job {job_id} failed: {str(e)}')
+    print(f'Processed {len(job_ids)} fanout jobs, inserted {total} notifications')
+
+@app.cli.command('trim-feeds')
+def trim_feeds_command():
+    """清理首页关注流中超出保留条数和已失效的条目（建议由cron定期运行）"""
+    deleted = feed_timeline.trim()
+    print(f'Trimmed {deleted} feed entries')
+
+@app.cli.command('rerender-content')
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认为CPU核数')
+@click.option('--batch-size', default=200, type=int, help='每批处理的记录数')
+def rerender_content_command(workers, batch_size):
+    """按当前渲染策略重新生成全部文章和评论的HTML"""
+    # 整个命令共用一个进程池，各批次不再重复启动工作进程
+    with render_pool_executor(workers) as pool:
+        for model in (Post, Comment):
+            table = model.__table__
+            stmt = table.update().where(
+                table.c.id == db.bindparam('b_id')
+            ).values(content_html=db.bindparam('b_html'))
+            
+            total = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(model.id, model.content).filter(
+                    model.id > last_id
+                ).order_by(model.id).limit(batch_size).all()
+                if not rows:
+                    break
+                htmls = render_many([row.content for row in rows], pool=pool)
+                db.session.execute(stmt, [
+                    {'b_id': row.id, 'b_html': html} for row, html in zip(rows, htmls)
+                ])
+                db.session.commit()
+                total += len(rows)
+                last_id = rows[-1].id
+            print(f'Re-rendered {total} {table.name}')
+
 def create_sample_data():
     """创建示例数据"""
     # 创建示例用户
@@ -994,6 +1385,9 @@ if __name__ == '__main__':
         sys.exit(0)
     with app.app_context():
         db.create_all()
+        ensure_search_index()
+        account_filter.request_rebuild()
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         create_sample_data()
+        suggestion_index.build()
     socketio.run(app, host='0.0.0.0', port=app.config['PORT'], debug=True)
@@ -7,7 +7,7 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.passwords import password_hasher
 from datetime import datetime, timezone
 import json
 
@@ -31,6 +31,7 @@ class User(UserMixin, db.Model):
     followers_count = db.Column(db.Integer, default=0)
     following_count = db.Column(db.Integer, default=0)
     posts_count = db.Column(db.Integer, default=0)
+    unread_notifications_count = db.Column(db.Integer, default=0)
     
     # 状态管理
     is_active = db.Column(db.Boolean, default=True)
@@ -75,32 +76,34 @@ class User(UserMixin, db.Model):
     )
 
     def set_password(self, password):
-        """设置密码哈希"""
-        self.password_hash = generate_password_hash(password)
+        """设置密码哈希（按当前配置，在密码哈希子进程中计算）"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """验证密码"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
     
     def is_following(self, user):
         """检查是否关注某用户"""
         return self.following.filter_by(followed_id=user.id).first() is not None
     
     def follow(self, user):
-        """关注用户"""
-        if not self.is_following(user):
-            follow = Follow(follower=self, followed=user)
-            db.session.add(follow)
-            self.following_count += 1
-            user.followers_count += 1
+        """关注用户（幂等插入 + 原子计数，由调用方提交）"""
+        from utils.counters import insert_ignore, increment
+        if insert_ignore(Follow.__table__, {'follower_id': self.id, 'followed_id': user.id}):
+            increment(User.__table__.c.following_count, self.id, 1)
+            increment(User.__table__.c.followers_count, user.id, 1)
     
     def unfollow(self, user):
-        """取消关注"""
-        follow = self.following.filter_by(followed_id=user.id).first()
-        if follow:
-            db.session.delete(follow)
-            self.following_count -= 1
-            user.followers_count -= 1
+        """取消关注（由调用方提交）"""
+        from utils.counters import increment
+        deleted = db.session.execute(db.delete(Follow.__table__).where(
+            Follow.__table__.c.follower_id == self.id,
+            Follow.__table__.c.followed_id == user.id
+        )).rowcount
+        if deleted:
+            increment(User.__table__.c.following_count, self.id, -1)
+            increment(User.__table__.c.followers_count, user.id, -1)
     
     def to_dict(self, include_email=False):
         """转换为字典"""
@@ -138,6 +141,7 @@ class Post(db.Model):
     status = db.Column(db.String(20), default='published')  # draft, published, archived
     is_featured = db.Column(db.Boolean, default=False)
     allow_comments = db.Column(db.Boolean, default=True)
+    render_status = db.Column(db.String(20), default='ready')  # ready, pending, failed
     
     # 统计信息
     view_count = db.Column(db.Integer, default=0)
@@ -163,12 +167,28 @@ class Post(db.Model):
     categories = db.relationship('Category', secondary='post_categories', backref='posts', lazy='dynamic')
     
     def increment_view_count(self):
-        self.view_count += 1
-        db.session.add(self)
-        db.session.commit()
-    
-    def to_dict(self, include_content=True):
-        """转换为字典"""
+        """记录一次浏览，由写缓冲批量写回数据库"""
+        from utils.view_counter import view_counter
+        view_counter.increment(self.id)
+    
+    @property
+    def live_view_count(self):
+        """包含尚未写回的缓冲增量的浏览量"""
+        from utils.view_counter import view_counter
+        return (self.view_count or 0) + view_counter.pending(self.id)
+    
+    def to_dict(self, include_content=True, author=None, tags=None, categories=None):
+        """转换为字典
+
+        author/tags/categories 可由批量序列化器预先加载后传入，
+        未传入时按关系惰性加载
+        """
+        if author is None:
+            author = self.author
+        if tags is None:
+            tags = self.tags
+        if categories is None:
+            categories = self.categories
         data = {
             'id': self.id,
             'title': self.title,
@@ -177,13 +197,14 @@ class Post(db.Model):
             'status': self.status,
             'is_featured': self.is_featured,
             'allow_comments': self.allow_comments,
+            'render_status': self.render_status or 'ready',
             'view_count': self.view_count,
             'like_count': self.like_count,
             'comment_count': self.comment_count,
             'favorite_count': self.favorite_count,
-            'author': self.author.to_dict(),
-            'tags': [tag.to_dict() for tag in self.tags],
-            'categories': [category.to_dict() for category in self.categories],
+            'author': author.to_dict(),
+            'tags': [tag.to_dict() for tag in tags],
+            'categories': [category.to_dict() for category in categories],
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'published_at': self.published_at.isoformat() if self.published_at else None
@@ -228,8 +249,15 @@ class Comment(db.Model):
     # 点赞关系
     likes = db.relationship('Like', backref='comment', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_replies=True):
-        """转换为字典"""
+    def to_dict(self, include_replies=True, author=None, replies=None):
+        """
+        转换为字典
+
+        author、replies 可由调用方批量预加载后传入（见 utils.serializers.serialize_comments），
+        replies 为已序列化的回复字典列表；未传入时按关系惰性加载
+        """
+        if author is None:
+            author = self.author
         data = {
             'id': self.id,
             'content': self.content,
@@ -237,13 +265,15 @@ class Comment(db.Model):
             'status': self.status,
             'like_count': self.like_count,
             'reply_count': self.reply_count,
-            'author': self.author.to_dict(),
+            'author': author.to_dict(),
             'post_id': self.post_id,
             'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
-        if include_replies and self.replies:
+        if include_replies and replies is not None:
+            data['replies'] = replies
+        elif include_replies and self.replies:
             data['replies'] = [reply.to_dict(include_replies=False) for reply in self.replies.limit(5)]
         return data
 
@@ -385,11 +415,16 @@ class Notification(db.Model):
     message = db.Column(db.Text, default='')
     data = db.Column(db.Text, default='')  # JSON格式的额外数据
     
+    # 合并：同一分组键的事件在时间窗口内合并为一条，actor_id 为最近一位触发者
+    group_key = db.Column(db.String(100), nullable=True)
+    actor_count = db.Column(db.Integer, default=1)
+    
     # 状态
     is_read = db.Column(db.Boolean, default=False)
     
     # 时间戳
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     # 关系
     actor = db.relationship('User', foreign_keys=[actor_id])
@@ -404,7 +439,9 @@ class Notification(db.Model):
             'title': self.title,
             'message': self.message,
             'is_read': self.is_read,
-            'created_at': self.created_at.isoformat()
+            'actor_count': self.actor_count or 1,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': (self.updated_at or self.created_at).isoformat()
         }
         
         if self.actor:
@@ -421,6 +458,48 @@ class Notification(db.Model):
         
         return data
 
+class NotificationFanoutJob(db.Model):
+    """关注者通知扇出任务，记录已处理到的关注者ID，进程重启后可从断点继续"""
+    __tablename__ = 'notification_fanout_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=True)
+    type = db.Column(db.String(50), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, default='')
+    
+    # 进度：pending 待处理或处理中，failed 重试耗尽；完成的任务直接删除
+    last_follower_id = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class NotificationActor(db.Model):
+    """合并通知的触发者，每位触发者只计入一次 actor_count"""
+    __tablename__ = 'notification_actors'
+    
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='CASCADE'), primary_key=True)
+    actor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+
+class NotificationArchive(db.Model):
+    """已归档通知（精简字段，不设外键，由保留任务从 notifications 移入）"""
+    __tablename__ = 'notification_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)  # 沿用原通知ID
+    user_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    actor_id = db.Column(db.Integer, nullable=True)
+    post_id = db.Column(db.Integer, nullable=True)
+    actor_count = db.Column(db.Integer, default=1)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, default='')
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
 class ViewLog(db.Model):
     """浏览记录模型"""
     __tablename__ = 'view_logs'
@@ -441,9 +520,81 @@ class ViewLog(db.Model):
     user = db.relationship('User')
     post = db.relationship('Post')
 
+class AuthorStats(db.Model):
+    """作者统计汇总（物化表），由写入路径增量维护"""
+    __tablename__ = 'author_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total_posts = db.Column(db.Integer, nullable=False, default=0)
+    total_views = db.Column(db.Integer, nullable=False, default=0)
+    total_likes = db.Column(db.Integer, nullable=False, default=0)
+    total_comments = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'total_posts': self.total_posts,
+            'total_views': self.total_views,
+            'total_likes': self.total_likes,
+            'total_comments': self.total_comments
+        }
+
+class AuthorDailyViews(db.Model):
+    """作者每日浏览量（物化表）"""
+    __tablename__ = 'author_daily_views'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+
+class PostViewRollup(db.Model):
+    """文章浏览汇总（按小时/按天），独立用户数和独立IP数以HyperLogLog草图保存"""
+    __tablename__ = 'post_view_rollups'
+    
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)  # hour, day
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    users_hll = db.Column(db.LargeBinary, nullable=True)
+    ips_hll = db.Column(db.LargeBinary, nullable=True)
+
+class RollupCheckpoint(db.Model):
+    """汇总任务进度，记录最后汇总的浏览记录的 (浏览时间, ID)"""
+    __tablename__ = 'rollup_checkpoints'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    last_viewed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class FeedEntry(db.Model):
+    """首页关注流条目，作者发布文章时写入每个关注者的时间线"""
+    __tablename__ = 'feed_entries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    published_at = db.Column(db.DateTime, nullable=False)
+
 # 创建索引以提高查询性能
 db.Index('idx_posts_status_created_at', Post.status, Post.created_at)
-db.Index('idx_posts_author_id', Post.author_id)
-db.Index('idx_comments_post_id', Comment.post_id)
+db.Index('idx_posts_status_published_at', Post.status, Post.published_at)
+db.Index('idx_posts_status_view_count', Post.status, Post.view_count)
+db.Index('idx_posts_status_like_count', Post.status, Post.like_count)
+db.Index('idx_posts_status_comment_count', Post.status, Post.comment_count)
+db.Index('idx_posts_author_status_published_at', Post.author_id, Post.status, Post.published_at)
+db.Index('idx_comments_post_parent_status_created_at', Comment.post_id, Comment.parent_id, Comment.status, Comment.created_at)
+db.Index('idx_comments_parent_status_created_at', Comment.parent_id, Comment.status, Comment.created_at)
 db.Index('idx_comments_author_id', Comment.author_id)
+db.Index('idx_notifications_user_id_updated_at', Notification.user_id, Notification.updated_at)
+db.Index('idx_notifications_user_id_is_read_updated_at', Notification.user_id, Notification.is_read, Notification.updated_at)
+db.Index('idx_notifications_user_id_group_key', Notification.user_id, Notification.group_key, Notification.is_read)
+db.Index('idx_notifications_is_read_created_at', Notification.is_read, Notification.created_at)
+db.Index('idx_notification_fanout_jobs_status', NotificationFanoutJob.status)
+db.Index('idx_notification_archives_user_id_created_at', NotificationArchive.user_id, NotificationArchive.created_at)
+db.Index('idx_follows_followed_id_follower_id', Follow.followed_id, Follow.follower_id)
 db.Index('idx_view_logs_post_id_viewed_at', ViewLog.post_id, ViewLog.viewed_at)
+db.Index('idx_view_logs_viewed_at_id', ViewLog.viewed_at, ViewLog.id)
+db.Index('idx_post_view_rollups_granularity_bucket', PostViewRollup.granularity, PostViewRollup.bucket_start)
+db.Index('idx_feed_entries_user_published_at', FeedEntry.user_id, FeedEntry.published_at, FeedEntry.post_id)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表接口查询计划检查脚本 - 直接在backend目录运行
+在临时SQLite库上对各列表接口的查询执行 EXPLAIN QUERY PLAN，
+确认排序走索引，而不是全表扫描后用临时B树排序
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# 使用临时数据库，不影响正在使用的数据
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+
+# 添加到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db
+from models import Post, Comment, Notification
+from utils.pagination import encode_cursor, keyset_query
+
+def explain(query):
+    """返回查询计划的明细行"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+def cursor_query(query, sort_column, descending=True):
+    """构造与游标分页第二页相同形态的查询"""
+    sort_key = f'{sort_column.key}:{"desc" if descending else "asc"}'
+    value = datetime(2024, 1, 1) if sort_column.key.endswith('_at') else 10
+    cursor = encode_cursor(sort_key, value, 100)
+    id_column = sort_column.class_.id
+    return keyset_query(query, sort_column, id_column, cursor, sort_key, descending).limit(11)
+
+def listing_queries():
+    """各列表接口使用的查询形态"""
+    published = Post.query.filter(Post.status == 'published')
+    queries = []
+    for column in (Post.created_at, Post.published_at, Post.view_count, Post.like_count, Post.comment_count):
+        queries.append((f'文章列表 按{column.key}倒序', published.order_by(column.desc()).limit(10)))
+        queries.append((f'文章列表 按{column.key}游标', cursor_query(published, column)))
+
+    roots = Comment.query.filter_by(post_id=1, parent_id=None, status='approved')
+    queries.append(('文章评论', roots.order_by(Comment.created_at.desc()).limit(10)))
+    queries.append(('文章评论 游标', cursor_query(roots, Comment.created_at)))
+    replies = Comment.query.filter_by(parent_id=1, status='approved')
+    queries.append(('评论回复 游标', cursor_query(replies, Comment.created_at, descending=False)))
+
+    notifications = Notification.query.filter_by(user_id=1)
+    queries.append(('通知列表', notifications.order_by(Notification.updated_at.desc(), Notification.id.desc()).limit(20)))
+    queries.append(('未读通知', notifications.filter_by(is_read=False).order_by(Notification.updated_at.desc(), Notification.id.desc()).limit(20)))
+    queries.append(('通知列表 游标', cursor_query(notifications, Notification.updated_at)))
+    return queries
+
+def check_query_plans():
+    """逐个检查查询计划，返回不合格的数量"""
+    print("=== 列表接口查询计划检查 ===")
+    print("-" * 50)
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        for name, query in listing_queries():
+            plan = explain(query)
+            uses_index = any('USING INDEX' in step or 'USING COVERING INDEX' in step for step in plan)
+            temp_sort = any('USE TEMP B-TREE' in step for step in plan)
+            ok = uses_index and not temp_sort
+            failures += 0 if ok else 1
+            print(f"{'✓' if ok else '✗'} {name}")
+            for step in plan:
+                print(f"    {step}")
+    print("-" * 50)
+    print("全部通过" if not failures else f"{failures} 个查询未使用索引排序")
+    return failures
+
+if __name__ == '__main__':
+    try:
+        sys.exit(1 if check_query_plans() else 0)
+    finally:
+        os.remove(_db_path)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点赞/收藏/关注计数并发压测脚本 - 直接在backend目录运行
+多个线程同时反复切换点赞、收藏和关注，结束后核对计数列与关系表行数是否完全一致
+
+默认使用临时SQLite库；设置 STRESS_DATABASE_URL 可以对MySQL等数据库压测（会写入测试数据）
+用法: python mytool/stress_counters.py [线程数] [每线程切换次数]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import random
+
+_db_path = None
+if os.environ.get('STRESS_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['STRESS_DATABASE_URL']
+else:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+    os.close(_db_fd)
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+
+# 添加到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+
+from app import app, db
+from models import User, Post, Like, Favorite, Follow
+
+# 压测时不输出逐条请求日志
+logging.disable(logging.INFO)
+
+def setup(user_count):
+    """创建压测用户和一篇文章，返回 (文章ID, 作者ID, [(用户ID, token)])"""
+    suffix = random.randint(100000, 999999)
+    users = [
+        User(username=f'stress_{suffix}_{i}', email=f'stress_{suffix}_{i}@example.com')
+        for i in range(user_count + 1)
+    ]
+    for user in users:
+        user.set_password('Stress123!')
+    db.session.add_all(users)
+    db.session.commit()
+
+    author = users[0]
+    post = Post(title=f'stress {suffix}', slug=f'stress-{suffix}', content='stress', author_id=author.id)
+    db.session.add(post)
+    db.session.commit()
+    tokens = [(user.id, create_access_token(identity=user)) for user in users[1:]]
+    return post.id, author.id, tokens
+
+def worker(client, token, post_id, author_id, rounds, errors):
+    headers = {'Authorization': f'Bearer {token}'}
+    actions = [
+        f'/api/posts/{post_id}/like',
+        f'/api/posts/{post_id}/favorite',
+        f'/api/users/{author_id}/follow',
+    ]
+    for _ in range(rounds):
+        response = client.post(random.choice(actions), headers=headers)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+def verify(post_id, author_id, user_ids):
+    """核对计数列和关系表行数"""
+    db.session.expire_all()
+    post = db.session.get(Post, post_id)
+    author = db.session.get(User, author_id)
+    checks = [
+        ('点赞数', post.like_count, Like.query.filter_by(post_id=post_id).count()),
+        ('收藏数', post.favorite_count, Favorite.query.filter_by(post_id=post_id).count()),
+        ('粉丝数', author.followers_count, Follow.query.filter_by(followed_id=author_id).count()),
+    ]
+    following_ok = all(
+        (db.session.get(User, uid).following_count or 0) ==
+        Follow.query.filter_by(follower_id=uid).count()
+        for uid in user_ids
+    )
+    checks.append(('关注数', 'ok' if following_ok else 'mismatch', 'ok'))
+    return checks
+
+def run(thread_count=16, rounds=50):
+    print("=== 计数并发压测 ===")
+    print(f"线程数: {thread_count}, 每线程切换次数: {rounds}")
+    print("-" * 50)
+    app.config['NOTIFICATION_COALESCE_WINDOW'] = 3600
+    with app.app_context():
+        db.create_all()
+        post_id, author_id, tokens = setup(thread_count)
+
+    errors = []
+    threads = []
+    for _, token in tokens:
+        client = app.test_client()
+        thread = threading.Thread(target=worker, args=(client, token, post_id, author_id, rounds, errors))
+        threads.append(thread)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failures = 0
+    with app.app_context():
+        for name, counter, actual in verify(post_id, author_id, [uid for uid, _ in tokens]):
+            ok = counter == actual
+            failures += 0 if ok else 1
+            print(f"{'✓' if ok else '✗'} {name}: 计数列={counter}, 实际={actual}")
+    print("-" * 50)
+    print(f"请求失败数（事务整体回滚，不影响计数一致性）: {len(errors)}")
+    print("计数全部一致" if not failures else f"{failures} 项计数不一致")
+    return failures
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    try:
+        sys.exit(1 if run(*args) else 0)
+    finally:
+        if _db_path:
+            os.remove(_db_path)
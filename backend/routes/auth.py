@@ -6,7 +6,7 @@
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token, create_refresh_token
+from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token, create_refresh_token, current_user
 from datetime import datetime, timedelta, timezone
 from flask import current_app
 from werkzeug.utils import secure_filename
@@ -19,6 +19,9 @@ from utils.auth import (
     generate_password_reset_token, confirm_password_reset_token,
     get_user_by_email, has_permission, get_user_permissions
 )
+from utils.passwords import password_hasher, PasswordHasherBusy
+from utils.rate_limit import rate_limiter, json_field
+from utils.bloom import account_filter
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -84,6 +87,7 @@ def register():
         email=email,
         nickname=nickname or username
     )
+    # 在哈希子进程中计算，繁忙时返回503
     user.set_password(password)
     
     db.session.add(user)
@@ -106,6 +110,7 @@ def register():
     }), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limiter.limit('login', '20/minute', per_account='5/minute', account=json_field('username_or_email'))
 def login():
     """用户登录"""
     data = request.get_json()
@@ -143,6 +148,13 @@ def login():
             'error': 'account_disabled'
         }), 401
     
+    # 哈希参数变化后按新参数重新哈希（繁忙时留到下次登录）
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.set_password(password)
+        except PasswordHasherBusy:
+            pass
+    
     # 更新最后登录时间
     user.last_login_at = datetime.utcnow()
     db.session.commit()
@@ -164,20 +176,18 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     """刷新访问令牌"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or not user.is_active:
+    # 只读：使用JWT身份解析得到的用户快照
+    if not current_user or not current_user.is_active:
         return jsonify({
             'message': '用户不存在或已被禁用',
             'error': 'invalid_user'
         }), 401
     
-    new_access_token = create_access_token(identity=user)
+    new_access_token = create_access_token(identity=current_user)
     return jsonify({
         'access_token': new_access_token,
-        'user': user.to_dict(),
-        'permissions': get_user_permissions(user)
+        'user': current_user.to_dict(),
+        'permissions': get_user_permissions(current_user)
     })
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -192,8 +202,8 @@ def logout():
 @jwt_required()
 def get_current_user():
     """获取当前用户信息"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    # 完整资料和计数不在身份快照中，按主键加载一次；权限按快照计算
+    user = db.session.get(User, current_user.id)
     
     if not user:
         return jsonify({
@@ -203,15 +213,15 @@ def get_current_user():
     
     return jsonify({
         'user': user.to_dict(include_email=True),
-        'permissions': get_user_permissions(user)
+        'permissions': get_user_permissions(current_user)
     })
 
 @auth_bp.route('/me', methods=['PUT'])
 @jwt_required()
 def update_profile():
     """更新用户资料"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    # 需要修改用户，加载ORM对象（提交后本进程的快照缓存随之失效）
+    user = db.session.get(User, current_user.id)
     
     if not user:
         return jsonify({
@@ -271,8 +281,8 @@ def update_profile():
 @jwt_required()
 def change_password():
     """修改密码"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    # 需要修改用户，加载ORM对象（提交后本进程的快照缓存随之失效）
+    user = db.session.get(User, current_user.id)
     
     if not user:
         return jsonify({
@@ -310,6 +320,7 @@ def change_password():
     return jsonify({'message': '密码修改成功'})
 
 @auth_bp.route('/forgot-password', methods=['POST'])
+@rate_limiter.limit('forgot_password', '10/hour', per_account='3/hour', account=json_field('email'))
 def forgot_password():
     """忘记密码"""
     data = request.get_json()
@@ -429,8 +440,7 @@ def upload_avatar():
     base_url = request.host_url.rstrip('/')
     public_url = f"{base_url}/{public_path}"
 
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = db.session.get(User, current_user.id)
     user.avatar = public_url
     db.session.commit()
 
@@ -502,6 +512,7 @@ def resend_confirmation():
     })
 
 @auth_bp.route('/check-username', methods=['GET'])
+@rate_limiter.limit('check_username', '60/minute')
 def check_username():
     """检查用户名是否可用"""
     username = request.args.get('username', '').strip()
@@ -518,6 +529,10 @@ def check_username():
             'message': '用户名格式不正确'
         })
     
+    # 布隆过滤器判定一定未注册时无需查库
+    if not account_filter.might_exist('username', username):
+        return jsonify({'available': True, 'message': '用户名可用'})
+    
     existing_user = User.query.filter_by(username=username).first()
     
     return jsonify({
@@ -526,6 +541,7 @@ def check_username():
     })
 
 @auth_bp.route('/check-email', methods=['GET'])
+@rate_limiter.limit('check_email', '60/minute')
 def check_email():
     """检查邮箱是否可用"""
     email = request.args.get('email', '').strip()
@@ -542,6 +558,10 @@ def check_email():
             'message': '邮箱格式不正确'
         })
     
+    # 布隆过滤器判定一定未注册时无需查库
+    if not account_filter.might_exist('email', email):
+        return jsonify({'available': True, 'message': '邮箱可用'})
+    
     existing_user = User.query.filter_by(email=email).first()
     
     return jsonify({
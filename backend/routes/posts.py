@@ -6,7 +6,7 @@
 """
 
 from flask import Blueprint, request, jsonify, g
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from sqlalchemy import or_, and_
 from datetime import datetime, timedelta, timezone
 
@@ -17,11 +17,22 @@ from utils.validators import (
     generate_excerpt, clean_search_query, validate_slug
 )
 from utils.auth import has_permission
-from utils.renderer import render_markdown
+from utils.render_pool import render_pool
+from utils.serializers import serialize_posts, load_user_interactions, load_authors
+from utils.view_log import view_log_pipeline
+from utils.search import apply_search
+from utils.suggestions import suggestion_index
+from utils.notifications import notification_fanout
+from utils.response_cache import response_cache
+from utils.trending import trending, PERIODS
+from utils.counters import toggle_like, toggle_favorite, increment
+from utils.pagination import cursor_requested, cursor_page, count_cache_key, InvalidCursor
 
 posts_bp = Blueprint('posts', __name__)
 
 @posts_bp.route('/', methods=['GET'])
+@response_cache.cached(groups=('posts',))
+@jwt_required(optional=True)
 def get_posts():
     """获取文章列表"""
     page = request.args.get('page', 1, type=int)
@@ -31,16 +42,15 @@ def get_posts():
     category = request.args.get('category', '').strip()
     author = request.args.get('author', '').strip()
     status = request.args.get('status', 'published')
-    sort_by = request.args.get('sort_by', 'created_at')
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'created_at')
     order = request.args.get('order', 'desc')
     
     # 检查是否有权限查看草稿
-    current_user_id = get_jwt_identity() if request.headers.get('Authorization') else None
+    current_user_id = get_jwt_identity()
     show_drafts = False
     
     if status == 'draft' and current_user_id:
-        user = User.query.get(current_user_id)
-        if user and (has_permission(user, 'create_posts') or user.is_admin):
+        if current_user and (has_permission(current_user, 'create_posts') or current_user.is_admin):
             show_drafts = True
     
     # 基础查询
@@ -49,15 +59,10 @@ def get_posts():
     else:
         query = Post.query.filter_by(status='published')
     
-    # 搜索过滤
+    # 搜索过滤（全文索引，按相关度排序）
+    relevance = None
     if search:
-        query = query.filter(
-            or_(
-                Post.title.contains(search),
-                Post.content.contains(search),
-                Post.summary.contains(search)
-            )
-        )
+        query, relevance = apply_search(query, search)
     
     # 标签过滤
     if tag:
@@ -83,33 +88,33 @@ def get_posts():
     else:
         sort_field = Post.created_at
     
-    if order == 'asc':
-        query = query.order_by(sort_field.asc())
+    # 游标分页（按排序字段+ID定位，相关度排序时按创建时间）
+    cursor_mode = cursor_requested(request.args)
+    if cursor_mode:
+        try:
+            posts, pagination_data = cursor_page(
+                query, sort_field, Post.id, request.args, per_page,
+                sort_key=f'{sort_field.key}:{order}',
+                descending=order != 'asc',
+                count_key=count_cache_key('posts_bp', request.args, current_user_id if show_drafts else None)
+            )
+        except InvalidCursor:
+            return jsonify({
+                'message': '分页游标无效',
+                'error': 'invalid_cursor'
+            }), 400
     else:
-        query = query.order_by(sort_field.desc())
-    
-    # 分页
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    posts = pagination.items
-    
-    # 检查当前用户的点赞和收藏状态
-    user_likes = set()
-    user_favorites = set()
-    
-    if current_user_id:
-        user_likes = {like.post_id for like in Like.query.filter_by(user_id=current_user_id).all()}
-        user_favorites = {fav.post_id for fav in Favorite.query.filter_by(user_id=current_user_id).all()}
-    
-    posts_data = []
-    for post in posts:
-        post_dict = post.to_dict(include_content=False)
-        post_dict['liked'] = post.id in user_likes
-        post_dict['favorited'] = post.id in user_favorites
-        posts_data.append(post_dict)
-    
-    return jsonify({
-        'posts': posts_data,
-        'pagination': {
+        if relevance is not None and sort_by == 'relevance':
+            query = query.order_by(relevance, Post.created_at.desc())
+        elif order == 'asc':
+            query = query.order_by(sort_field.asc())
+        else:
+            query = query.order_by(sort_field.desc())
+        
+        # 分页
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        posts = pagination.items
+        pagination_data = {
             'page': page,
             'per_page': per_page,
             'total': pagination.total,
@@ -117,16 +122,31 @@ def get_posts():
             'has_prev': pagination.has_prev,
             'has_next': pagination.has_next
         }
+    
+    # 检查当前用户对本页文章的点赞和收藏状态
+    user_likes, user_favorites = load_user_interactions(
+        current_user_id, [post.id for post in posts]
+    )
+    
+    posts_data = serialize_posts(posts)
+    for post_dict in posts_data:
+        post_dict['liked'] = post_dict['id'] in user_likes
+        post_dict['favorited'] = post_dict['id'] in user_favorites
+    
+    return jsonify({
+        'posts': posts_data,
+        'pagination': pagination_data
     })
 
 @posts_bp.route('/<int:post_id>', methods=['GET'])
+@jwt_required(optional=True)
 def get_post(post_id):
     """获取单篇文章详情"""
     post = Post.query.get_or_404(post_id)
+    current_user_id = get_jwt_identity()
     
     # 检查权限
     if post.status != 'published':
-        current_user_id = get_jwt_identity() if request.headers.get('Authorization') else None
         if not current_user_id or (post.author_id != current_user_id and not post.author.is_admin):
             return jsonify({
                 'message': '文章不存在或无权限查看',
@@ -136,8 +156,14 @@ def get_post(post_id):
     # 增加浏览次数
     post.increment_view_count()
     
-    # 记录浏览日志（简化版本，不记录详细日志）
-    current_user_id = get_jwt_identity() if request.headers.get('Authorization') else None
+    # 记录浏览日志（异步批量写入）
+    view_log_pipeline.record(
+        post_id=post.id,
+        user_id=current_user_id,
+        ip_address=request.remote_addr,
+        user_agent=request.headers.get('User-Agent'),
+        referer=request.referrer
+    )
     
     # 检查当前用户的点赞和收藏状态
     liked = False
@@ -148,6 +174,7 @@ def get_post(post_id):
         favorited = Favorite.query.filter_by(user_id=current_user_id, post_id=post_id).first() is not None
     
     post_dict = post.to_dict()
+    post_dict['view_count'] = post.live_view_count
     post_dict['liked'] = liked
     post_dict['favorited'] = favorited
     
@@ -217,7 +244,6 @@ def create_post():
         title=title,
         slug=slug,
         content=content,
-        content_html=render_markdown(content),
         summary=summary or generate_excerpt(content),
         status=status,
         is_featured=is_featured,
@@ -228,6 +254,9 @@ def create_post():
     if status == 'published':
         post.published_at = datetime.utcnow()
     
+    # 大文章提交后交给进程池渲染
+    render_async = render_pool.prepare(post, content)
+    
     # 处理标签
     if tags:
         for tag_name in tags:
@@ -260,25 +289,23 @@ def create_post():
     
     db.session.add(post)
     
-    # 更新用户的文章计数
-    user = User.query.get(current_user_id)
-    user.posts_count += 1
+    # 更新用户的文章计数（原子自增，不加载用户行）
+    increment(User.posts_count, current_user_id, 1)
     
     db.session.commit()
     
-    # 通知关注者（如果是发布文章）
+    if render_async:
+        render_pool.submit(post.id, content)
+    
+    # 通知关注者（如果是发布文章，后台批量扇出）
     if status == 'published':
-        followers = user.followers.all()
-        for follower in followers:
-            from app import create_notification
-            create_notification(
-                user_id=follower.id,
-                type='new_post',
-                title='新文章发布',
-                message=f'{user.nickname or user.username} 发布了新文章《{post.title}》',
-                actor_id=user.id,
-                post_id=post.id
-            )
+        notification_fanout.notify_followers(
+            author_id=current_user.id,
+            type='new_post',
+            title='新文章发布',
+            message=f'{current_user.nickname or current_user.username} 发布了新文章《{post.title}》',
+            post_id=post.id
+        )
     
     return jsonify({
         'message': '文章创建成功',
@@ -300,6 +327,8 @@ def update_post(post_id):
         }), 403
     
     data = request.get_json()
+    render_async = False
+    first_published = False
     
     # 更新字段
     if 'title' in data:
@@ -319,7 +348,7 @@ def update_post(post_id):
                 'error': 'invalid_content'
             }), 400
         post.content = content
-        post.content_html = render_markdown(content)
+        render_async = render_pool.prepare(post, content)
         post.summary = generate_excerpt(content)
     
     if 'summary' in data:
@@ -336,6 +365,7 @@ def update_post(post_id):
         post.status = new_status
         if new_status == 'published' and not post.published_at:
             post.published_at = datetime.now(timezone.utc)
+            first_published = True
     
     if 'is_featured' in data:
         post.is_featured = bool(data['is_featured'])
@@ -382,6 +412,20 @@ def update_post(post_id):
     post.updated_at = datetime.now(timezone.utc)
     db.session.commit()
     
+    if render_async:
+        render_pool.submit(post.id, post.content)
+    
+    # 草稿首次发布时通知关注者并写入关注流（后台批量扇出）
+    if first_published:
+        author = post.author
+        notification_fanout.notify_followers(
+            author_id=author.id,
+            type='new_post',
+            title='新文章发布',
+            message=f'{author.nickname or author.username} 发布了新文章《{post.title}》',
+            post_id=post.id
+        )
+    
     return jsonify({
         'message': '文章更新成功',
         'post': post.to_dict()
@@ -404,8 +448,7 @@ def delete_post(post_id):
     db.session.delete(post)
     
     # 更新用户的文章计数
-    user = User.query.get(current_user_id)
-    user.posts_count -= 1
+    increment(User.posts_count, current_user_id, -1)
     
     db.session.commit()
     
@@ -417,45 +460,29 @@ def like_post(post_id):
     """点赞文章"""
     post = Post.query.get_or_404(post_id)
     current_user_id = get_jwt_identity()
-    
-    # 检查是否已经点赞
-    existing_like = Like.query.filter_by(
-        user_id=current_user_id,
-        post_id=post_id
-    ).first()
-    
-    if existing_like:
-        # 取消点赞
-        db.session.delete(existing_like)
-        post.like_count -= 1
-        message = '已取消点赞'
-        liked = False
-    else:
-        # 添加点赞
-        like = Like(user_id=current_user_id, post_id=post_id)
-        db.session.add(like)
-        post.like_count += 1
-        message = '点赞成功'
-        liked = True
-        
-        # 创建通知（如果不是自己的文章）
-        if post.author_id != current_user_id:
-            from app import create_notification
-            create_notification(
-                user_id=post.author_id,
-                type='like',
-                title='文章被点赞',
-                message=f'有人点赞了你的文章《{post.title}》',
-                actor_id=current_user_id,
-                post_id=post_id
-            )
-    
-    db.session.commit()
+    post_author_id = post.author_id
+    post_title = post.title
+    
+    # 已点赞则取消，否则点赞；关系增删和计数更新在同一个短事务中原子完成
+    liked, like_count = toggle_like(current_user_id, post)
+    message = '点赞成功' if liked else '已取消点赞'
+    
+    # 创建通知（如果不是自己的文章）
+    if liked and post_author_id != current_user_id:
+        from app import create_notification
+        create_notification(
+            user_id=post_author_id,
+            type='like',
+            title='文章被点赞',
+            message=f'有人点赞了你的文章《{post_title}》',
+            actor_id=current_user_id,
+            post_id=post_id
+        )
     
     return jsonify({
         'message': message,
         'liked': liked,
-        'like_count': post.like_count
+        'like_count': like_count
     })
 
 @posts_bp.route('/<int:post_id>/favorite', methods=['POST'])
@@ -465,35 +492,18 @@ def favorite_post(post_id):
     post = Post.query.get_or_404(post_id)
     current_user_id = get_jwt_identity()
     
-    # 检查是否已经收藏
-    existing_favorite = Favorite.query.filter_by(
-        user_id=current_user_id,
-        post_id=post_id
-    ).first()
-    
-    if existing_favorite:
-        # 取消收藏
-        db.session.delete(existing_favorite)
-        post.favorite_count -= 1
-        message = '已取消收藏'
-        favorited = False
-    else:
-        # 添加收藏
-        favorite = Favorite(user_id=current_user_id, post_id=post_id)
-        db.session.add(favorite)
-        post.favorite_count += 1
-        message = '收藏成功'
-        favorited = True
-    
-    db.session.commit()
+    # 已收藏则取消，否则收藏（原子切换）
+    favorited, favorite_count = toggle_favorite(current_user_id, post)
+    message = '收藏成功' if favorited else '已取消收藏'
     
     return jsonify({
         'message': message,
         'favorited': favorited,
-        'favorite_count': post.favorite_count
+        'favorite_count': favorite_count
     })
 
 @posts_bp.route('/tags', methods=['GET'])
+@response_cache.cached(groups=('tags',))
 def get_tags():
     """获取所有标签"""
     tags = Tag.query.all()
@@ -502,6 +512,7 @@ def get_tags():
     })
 
 @posts_bp.route('/categories', methods=['GET'])
+@response_cache.cached(groups=('categories',))
 def get_categories():
     """获取所有分类"""
     categories = Category.query.all()
@@ -510,24 +521,23 @@ def get_categories():
     })
 
 @posts_bp.route('/popular', methods=['GET'])
+@response_cache.cached(groups=('posts',))
 def get_popular_posts():
     """获取热门文章"""
     limit = request.args.get('limit', 10, type=int)
     period = request.args.get('period', 'week')  # week, month, all
     
+    if period not in PERIODS:
+        period = 'all'
+    
     try:
-        query = Post.query.filter_by(status='published')
-        
-        # 根据时间段过滤
-        if period == 'week':
-            week_ago = datetime.utcnow() - timedelta(days=7)
-            query = query.filter(Post.published_at >= week_ago)
-        elif period == 'month':
-            month_ago = datetime.utcnow() - timedelta(days=30)
-            query = query.filter(Post.published_at >= month_ago)
-        
-        # 按浏览量排序
-        posts = query.order_by(Post.view_count.desc()).limit(limit).all()
+        # 从预计算的热门排行中取前 limit 篇，已下线或删除的文章在这里过滤掉
+        post_ids = trending.top(period, limit)
+        by_id = {post.id: post for post in Post.query.filter(
+            Post.id.in_(post_ids),
+            Post.status == 'published'
+        ).all()} if post_ids else {}
+        posts = [by_id[post_id] for post_id in post_ids if post_id in by_id]
         
         # 如果没有热门文章，返回最新的已发布文章作为备选
         if not posts:
@@ -536,7 +546,7 @@ def get_popular_posts():
             ).order_by(Post.published_at.desc()).limit(limit).all()
         
         return jsonify({
-            'posts': [post.to_dict(include_content=False) for post in posts]
+            'posts': serialize_posts(posts)
         })
     except Exception as e:
         current_app.logger.error(f"Error fetching popular posts: {str(e)}")
@@ -547,6 +557,7 @@ def get_popular_posts():
         }), 500
 
 @posts_bp.route('/featured', methods=['GET'])
+@response_cache.cached(groups=('posts',))
 def get_featured_posts():
     """获取推荐文章"""
     limit = request.args.get('limit', 10, type=int)
@@ -564,7 +575,7 @@ def get_featured_posts():
             ).order_by(Post.published_at.desc()).limit(limit).all()
         
         return jsonify({
-            'posts': [post.to_dict(include_content=False) for post in posts]
+            'posts': serialize_posts(posts)
         })
     except Exception as e:
         current_app.logger.error(f"Error fetching featured posts: {str(e)}")
@@ -575,6 +586,7 @@ def get_featured_posts():
         }), 500
 
 @posts_bp.route('/archives', methods=['GET'])
+@response_cache.cached(groups=('posts',))
 def get_archives():
     """获取文章归档"""
     try:
@@ -582,15 +594,39 @@ def get_archives():
         per_page = request.args.get('per_page', 10, type=int)
         
         # 获取已发布的文章，按发布时间倒序排列
-        posts = Post.query.filter_by(status='published').order_by(Post.published_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        query = Post.query.filter_by(status='published')
+        
+        # 游标分页：深页不再随OFFSET线性变慢，总数来自计数缓存
+        next_cursor = None
+        if cursor_requested(request.args):
+            try:
+                items, pagination_data = cursor_page(
+                    query, Post.published_at, Post.id, request.args, per_page,
+                    sort_key='published_at:desc',
+                    count_key=count_cache_key('archives', request.args)
+                )
+            except InvalidCursor:
+                return jsonify({
+                    'message': '分页游标无效',
+                    'error': 'invalid_cursor'
+                }), 400
+            next_cursor = pagination_data['next_cursor']
+            total = pagination_data.get('total')
+            has_next = pagination_data['has_next']
+        else:
+            posts = query.order_by(Post.published_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            items = posts.items
+            total = posts.total
+            has_next = posts.has_next
         
         # 格式化文章数据以匹配前端期望的格式
+        authors = load_authors(items)
         posts_data = []
-        for post in posts.items:
+        for post in items:
             # 获取作者信息
-            author = post.author.username if post.author else '未知作者'
+            author = authors[post.author_id].username if post.author_id in authors else '未知作者'
             
             # 创建文章摘要（前200字符）
             excerpt = post.content[:200] + '...' if len(post.content) > 200 else post.content
@@ -604,13 +640,16 @@ def get_archives():
                 'date': post.published_at.isoformat()
             })
         
-        return jsonify({
+        data = {
             'posts': posts_data,
-            'total': posts.total,
+            'total': total,
             'page': page,
             'per_page': per_page,
-            'has_next': posts.has_next
-        })
+            'has_next': has_next
+        }
+        if next_cursor is not None or cursor_requested(request.args):
+            data['next_cursor'] = next_cursor
+        return jsonify(data)
         
     except Exception as e:
         current_app.logger.error(f"Error fetching archives: {str(e)}")
@@ -633,33 +672,9 @@ def get_search_suggestions():
     if not query:
         return jsonify({'suggestions': []})
     
-    # 搜索文章标题
-    posts = Post.query.filter(
-        Post.title.contains(query),
-        Post.status == 'published'
-    ).limit(limit).all()
-    
-    # 搜索标签
-    tags = Tag.query.filter(Tag.name.contains(query)).limit(limit).all()
-    
-    suggestions = []
-    
-    # 添加文章建议
-    for post in posts:
-        suggestions.append({
-            'type': 'post',
-            'text': post.title,
-            'slug': post.slug,
-            'id': post.id
-        })
-    
-    # 添加标签建议
-    for tag in tags:
-        suggestions.append({
-            'type': 'tag',
-            'text': tag.name,
-            'slug': tag.slug,
-            'id': tag.id
-        })
+    # 内存前缀索引，文章和标签各按热度取前limit条
+    if not suggestion_index.built:
+        suggestion_index.build()
+    suggestions = suggestion_index.suggest(query, limit=limit)
     
     return jsonify({'suggestions': suggestions})
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+作者统计物化表维护
+文章、评论、点赞的增删在同一事务内累加到 author_stats，
+浏览量由写缓冲刷新和浏览日志落库时累加，仪表板只需按主键读取
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import event, select, update, insert, func
+from sqlalchemy.orm import Session
+
+from models import db, Post, Comment, Like, ViewLog, PostViewRollup, AuthorStats, AuthorDailyViews
+from utils.view_rollup import filter_unrolled
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('total_posts', 'total_views', 'total_likes', 'total_comments')
+
+def _upsert_increment(conn, table, keys, deltas):
+    """按主键累加计数，记录不存在时插入"""
+    now = datetime.now(timezone.utc)
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql', 'mysql'):
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        values = dict(keys, **deltas)
+        if 'updated_at' in table.c:
+            values['updated_at'] = now
+        stmt = dialect_insert(table).values(**values)
+        if dialect == 'mysql':
+            new = {k: table.c[k] + stmt.inserted[k] for k in deltas}
+            if 'updated_at' in table.c:
+                new['updated_at'] = stmt.inserted.updated_at
+            stmt = stmt.on_duplicate_key_update(new)
+        else:
+            new = {k: table.c[k] + stmt.excluded[k] for k in deltas}
+            if 'updated_at' in table.c:
+                new['updated_at'] = stmt.excluded.updated_at
+            stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=new)
+        conn.execute(stmt)
+        return
+
+    where = [table.c[k] == v for k, v in keys.items()]
+    new = {k: table.c[k] + v for k, v in deltas.items()}
+    if 'updated_at' in table.c:
+        new['updated_at'] = now
+    if conn.execute(update(table).where(*where).values(new)).rowcount == 0:
+        values = dict(keys, **deltas)
+        if 'updated_at' in table.c:
+            values['updated_at'] = now
+        conn.execute(insert(table).values(**values))
+
+def apply_deltas(conn, deltas):
+    """
+    写入作者统计增量
+
+    Args:
+        conn: 数据库连接
+        deltas (dict): 作者ID到 {字段: 增量} 的映射
+    """
+    table = AuthorStats.__table__
+    for author_id, fields in deltas.items():
+        fields = {k: v for k, v in fields.items() if v}
+        if fields:
+            _upsert_increment(conn, table, {'user_id': author_id}, fields)
+
+def apply_daily_views(conn, buckets):
+    """
+    写入作者每日浏览量增量
+
+    Args:
+        conn: 数据库连接
+        buckets (dict): (作者ID, 日期) 到浏览次数的映射
+    """
+    table = AuthorDailyViews.__table__
+    for (author_id, day), views in buckets.items():
+        if views:
+            _upsert_increment(conn, table, {'user_id': author_id, 'day': day}, {'views': views})
+
+def _post_authors(conn, post_ids, known=None):
+    """查询文章ID对应的作者ID，known 中已有的不再查询"""
+    authors = dict(known or {})
+    missing = [pid for pid in set(post_ids) if pid not in authors]
+    if missing:
+        rows = conn.execute(select(Post.id, Post.author_id).where(Post.id.in_(missing)))
+        authors.update({row.id: row.author_id for row in rows})
+    return authors
+
+def _changed(obj, attr):
+    """对象某个整数字段在本次flush中的变化量"""
+    history = db.inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return 0
+    old = history.deleted[0] if history.deleted else 0
+    new = history.added[0] if history.added else 0
+    return (new or 0) - (old or 0)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stats(session, flush_context):
+    deltas = defaultdict(lambda: defaultdict(int))
+    known = {}
+    post_refs = []  # (文章ID, 字段, 增量)
+
+    for obj in session.new:
+        if isinstance(obj, Post):
+            known[obj.id] = obj.author_id
+            deltas[obj.author_id]['total_posts'] += 1
+            deltas[obj.author_id]['total_views'] += obj.view_count or 0
+        elif isinstance(obj, Comment):
+            post_refs.append((obj.post_id, 'total_comments', 1))
+        elif isinstance(obj, Like) and obj.post_id:
+            post_refs.append((obj.post_id, 'total_likes', 1))
+
+    for obj in session.dirty:
+        if isinstance(obj, Post):
+            known[obj.id] = obj.author_id
+            deltas[obj.author_id]['total_views'] += _changed(obj, 'view_count')
+
+    # 删除文章时级联删除的评论和点赞也在 session.deleted 中，逐条扣减
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            known[obj.id] = obj.author_id
+            deltas[obj.author_id]['total_posts'] -= 1
+            deltas[obj.author_id]['total_views'] -= obj.view_count or 0
+    for obj in session.deleted:
+        if isinstance(obj, Comment):
+            post_refs.append((obj.post_id, 'total_comments', -1))
+        elif isinstance(obj, Like) and obj.post_id:
+            post_refs.append((obj.post_id, 'total_likes', -1))
+
+    if not deltas and not post_refs:
+        return
+    conn = session.connection()
+    authors = _post_authors(conn, [pid for pid, _, _ in post_refs], known)
+    for post_id, field, delta in post_refs:
+        if post_id in authors:
+            deltas[authors[post_id]][field] += delta
+    apply_deltas(conn, deltas)
+
+def record_view_counts(counts):
+    """浏览量写缓冲刷新后累加作者总浏览量（view_counter.on_flush 监听器）"""
+    conn = db.session.connection()
+    authors = _post_authors(conn, counts.keys())
+    deltas = defaultdict(lambda: defaultdict(int))
+    for post_id, count in counts.items():
+        if post_id in authors:
+            deltas[authors[post_id]]['total_views'] += count
+    try:
+        apply_deltas(conn, deltas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def record_view_logs(rows):
+    """浏览日志落库后累加作者每日浏览量（view_log_pipeline.on_write 监听器）"""
+    conn = db.session.connection()
+    authors = _post_authors(conn, [row['post_id'] for row in rows])
+    buckets = defaultdict(int)
+    for row in rows:
+        author_id = authors.get(row['post_id'])
+        if author_id is not None:
+            buckets[(author_id, row['viewed_at'].date())] += 1
+    try:
+        apply_daily_views(conn, buckets)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def get_author_stats(user_id, days=7):
+    """
+    读取作者统计和最近若干天的每日浏览量
+
+    Returns:
+        tuple: (统计字典, [{'date', 'views'}] 列表)
+    """
+    user_id = int(user_id)
+    stats = db.session.get(AuthorStats, user_id)
+    totals = stats.to_dict() if stats else {field: 0 for field in STAT_FIELDS}
+    start = datetime.now(timezone.utc).date() - timedelta(days=days)
+    rows = AuthorDailyViews.query.filter(
+        AuthorDailyViews.user_id == user_id,
+        AuthorDailyViews.day >= start
+    ).order_by(AuthorDailyViews.day).all()
+    return totals, [{'date': row.day.isoformat(), 'views': row.views} for row in rows]
+
+def _as_date(value):
+    """数据库返回的日期/时间（SQLite 为字符串）转换为 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def rebuild_author_stats():
+    """
+    按源数据重新计算全部作者统计（回填或修复漂移时使用）
+
+    每日浏览量来自浏览汇总表的天桶，加上检查点之后尚未汇总的原始记录；
+    超过保留期的原始记录已被删除，不能直接按原始记录重算
+
+    Returns:
+        int: 重建的作者数
+    """
+    totals = defaultdict(lambda: {field: 0 for field in STAT_FIELDS})
+    for row in db.session.query(
+        Post.author_id,
+        func.count(Post.id),
+        func.coalesce(func.sum(Post.view_count), 0),
+        func.coalesce(func.sum(Post.like_count), 0)
+    ).group_by(Post.author_id):
+        totals[row[0]].update(total_posts=row[1], total_views=int(row[2]), total_likes=int(row[3]))
+    for author_id, count in db.session.query(
+        Post.author_id, func.count(Comment.id)
+    ).join(Comment, Comment.post_id == Post.id).group_by(Post.author_id):
+        totals[author_id]['total_comments'] = count
+
+    daily = defaultdict(int)
+    for author_id, bucket, views in db.session.query(
+        Post.author_id, PostViewRollup.bucket_start, func.sum(PostViewRollup.views)
+    ).join(Post, Post.id == PostViewRollup.post_id).filter(
+        PostViewRollup.granularity == 'day'
+    ).group_by(Post.author_id, PostViewRollup.bucket_start):
+        daily[(author_id, _as_date(bucket))] += int(views or 0)
+    day = func.date(ViewLog.viewed_at)
+    unrolled = filter_unrolled(db.session.query(
+        Post.author_id, day, func.count(ViewLog.id)
+    ).join(Post, Post.id == ViewLog.post_id))
+    for author_id, value, views in unrolled.group_by(Post.author_id, day):
+        daily[(author_id, _as_date(value))] += views
+
+    now = datetime.now(timezone.utc)
+    db.session.execute(AuthorStats.__table__.delete())
+    db.session.execute(AuthorDailyViews.__table__.delete())
+    if totals:
+        db.session.execute(insert(AuthorStats.__table__), [
+            dict(values, user_id=author_id, updated_at=now) for author_id, values in totals.items()
+        ])
+    if daily:
+        db.session.execute(insert(AuthorDailyViews.__table__), [
+            {'user_id': author_id, 'day': value, 'views': views}
+            for (author_id, value), views in daily.items() if views
+        ])
+    db.session.commit()
+    return len(totals)
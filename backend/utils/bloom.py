@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+已注册用户名/邮箱的布隆过滤器
+注册表单逐字检查用户名和邮箱是否可用时，过滤器判定"一定不存在"即可直接回答可用，
+只有可能存在时才查库。过滤器在启动时由后台线程从用户表构建并定期重建，注册或修改用户名/邮箱提交后增量加入；
+首次构建失败（如数据表尚未创建）时，之后的查询会唤醒后台线程立即重试；
+大小写统一转为小写，大小写不敏感的数据库排序规则下也不会漏判
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from models import db, User
+from utils.process_pool import is_pool_worker
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """按容量和误判率确定位数组大小和哈希函数个数的布隆过滤器"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # 双重哈希：由一个摘要派生 hash_count 个位置
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class AccountFilter:
+    """用户名和邮箱各一个布隆过滤器"""
+
+    FIELDS = ('username', 'email')
+
+    def __init__(self, app=None):
+        self.app = None
+        self.capacity = 100000
+        self.error_rate = 0.01
+        self.rebuild_interval = 3600
+        self._filters = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.capacity = app.config.get('ACCOUNT_FILTER_CAPACITY', 100000)
+        self.error_rate = app.config.get('ACCOUNT_FILTER_ERROR_RATE', 0.01)
+        self.rebuild_interval = app.config.get('ACCOUNT_FILTER_REBUILD_INTERVAL', 3600)
+        if self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='account-filter', daemon=True)
+            self._thread.start()
+
+    def might_exist(self, field, value):
+        """
+        用户名或邮箱是否可能已被注册
+
+        过滤器尚未构建完成时返回True，由调用方查库
+        """
+        filters = self._filters
+        if filters is None:
+            self.request_rebuild()
+            return True
+        return value.lower() in filters[field]
+
+    def request_rebuild(self):
+        """唤醒后台线程立即重建（如 init-db 建表之后）"""
+        self._wakeup.set()
+
+    def add(self, username, email):
+        """加入新注册的用户；重建过程中同时记下，重建完成后补进新过滤器"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((username, email))
+            if self._filters is not None:
+                self._add(self._filters, username, email)
+
+    def _add(self, filters, username, email):
+        if username:
+            filters['username'].add(username.lower())
+        if email:
+            filters['email'].add(email.lower())
+
+    def rebuild(self):
+        """
+        从用户表重新构建过滤器，容量至少为当前用户数的两倍
+
+        Returns:
+            int: 加入的用户数
+        """
+        with self._lock:
+            self._pending = []
+        try:
+            total = db.session.query(func.count(User.id)).scalar() or 0
+            capacity = max(self.capacity, total * 2)
+            filters = {field: BloomFilter(capacity, self.error_rate) for field in self.FIELDS}
+            count = 0
+            for username, email in db.session.query(User.username, User.email).yield_per(5000):
+                self._add(filters, username, email)
+                count += 1
+            with self._lock:
+                for username, email in self._pending:
+                    self._add(filters, username, email)
+                self._filters = filters
+            return count
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            built = False
+            with self.app.app_context():
+                try:
+                    count = self.rebuild()
+                    built = True
+                    logger.info(f"Built account filter with {count} users")
+                except Exception as e:
+                    logger.warning(f"Failed to build account filter: {str(e)}")
+                finally:
+                    db.session.remove()
+            if not built:
+                # 构建失败（如数据表尚未创建）时一分钟后重试，期间有查询或建表时提前重试
+                self._wakeup.wait(60)
+                time.sleep(1)
+            elif self.rebuild_interval > 0:
+                self._wakeup.wait(self.rebuild_interval)
+            else:
+                return
+
+account_filter = AccountFilter()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_new_accounts(session, flush_context):
+    accounts = session.info.setdefault('account_filter_new', [])
+    for obj in session.new:
+        if isinstance(obj, User):
+            accounts.append((obj.username, obj.email))
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            # 改名后的新值加入过滤器；旧值留在过滤器中只会多查一次库，下次重建时清除
+            state = inspect(obj)
+            changed = [
+                getattr(obj, field) if state.attrs[field].history.has_changes() else None
+                for field in AccountFilter.FIELDS
+            ]
+            if any(changed):
+                accounts.append(tuple(changed))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_new_accounts(session):
+    for username, email in session.info.pop('account_filter_new', []):
+        account_filter.add(username, email)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_new_accounts(session):
+    session.info.pop('account_filter_new', None)
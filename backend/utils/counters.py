@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+点赞、收藏、关注的原子切换
+关系行用幂等的 INSERT（冲突时忽略）/ DELETE 增删，计数列用 UPDATE x = x ± 1 调整，
+以受影响行数决定是否改计数，多个worker并发时计数不丢失，也无需加载整行
+"""
+
+from sqlalchemy import insert, delete, update, select, and_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Post, User, Like, Favorite, Follow
+from utils.author_stats import apply_deltas
+from utils.response_cache import invalidate_on_commit
+
+def _insert_ignore_stmt(table):
+    """冲突时忽略的INSERT语句，数据库不支持时返回None"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if dialect == 'mysql':
+        return insert(table).prefix_with('IGNORE')
+    return None
+
+def insert_ignore(table, values):
+    """
+    插入一行，唯一约束冲突时什么也不做
+
+    Returns:
+        bool: 是否插入了新行
+    """
+    stmt = _insert_ignore_stmt(table)
+    if stmt is not None:
+        return db.session.execute(stmt.values(**values)).rowcount == 1
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+def insert_ignore_many(table, rows):
+    """批量插入多行，唯一约束冲突的行跳过"""
+    if not rows:
+        return
+    stmt = _insert_ignore_stmt(table)
+    if stmt is None:
+        for values in rows:
+            insert_ignore(table, values)
+        return
+    db.session.execute(stmt, rows)
+
+def increment(column, row_id, delta):
+    """对计数列执行 UPDATE x = x + delta"""
+    table = column.table
+    db.session.execute(update(table).where(table.c.id == row_id).values({column.key: column + delta}))
+
+def _toggle(table, keys, counters):
+    """
+    切换一条关系：存在则删除，不存在则插入，并按实际变化调整计数
+
+    Args:
+        table: 关系表
+        keys (dict): 关系的唯一键
+        counters (list): [(计数列, 行ID)]，关系新增时 +1、删除时 -1
+
+    Returns:
+        tuple: (切换后关系是否存在, 是否发生了变化)
+    """
+    where = and_(*[table.c[k] == v for k, v in keys.items()])
+    if db.session.execute(delete(table).where(where)).rowcount:
+        active, delta = False, -1
+    elif insert_ignore(table, keys):
+        active, delta = True, 1
+    else:
+        # 并发请求刚插入了同一条关系，视为已存在
+        return True, False
+    for column, row_id in counters:
+        increment(column, row_id, delta)
+    return active, True
+
+def _read(column, row_id):
+    return db.session.execute(select(column).where(column.table.c.id == row_id)).scalar() or 0
+
+def toggle_like(user_id, post):
+    """
+    切换点赞
+
+    Returns:
+        tuple: (是否已点赞, 最新点赞数)
+    """
+    liked, changed = _toggle(
+        Like.__table__,
+        {'user_id': user_id, 'post_id': post.id},
+        [(Post.__table__.c.like_count, post.id)]
+    )
+    if changed:
+        apply_deltas(db.session.connection(), {post.author_id: {'total_likes': 1 if liked else -1}})
+        invalidate_on_commit(db.session, 'posts')
+    count = _read(Post.__table__.c.like_count, post.id)
+    db.session.commit()
+    return liked, count
+
+def toggle_favorite(user_id, post):
+    """
+    切换收藏
+
+    Returns:
+        tuple: (是否已收藏, 最新收藏数)
+    """
+    favorited, changed = _toggle(
+        Favorite.__table__,
+        {'user_id': user_id, 'post_id': post.id},
+        [(Post.__table__.c.favorite_count, post.id)]
+    )
+    if changed:
+        invalidate_on_commit(db.session, 'posts')
+    count = _read(Post.__table__.c.favorite_count, post.id)
+    db.session.commit()
+    return favorited, count
+
+def toggle_follow(follower_id, followed_id):
+    """
+    切换关注
+
+    Returns:
+        tuple: (是否已关注, 被关注者最新粉丝数)
+    """
+    users = User.__table__
+    following, _ = _toggle(
+        Follow.__table__,
+        {'follower_id': follower_id, 'followed_id': followed_id},
+        [(users.c.following_count, follower_id), (users.c.followers_count, followed_id)]
+    )
+    count = _read(users.c.followers_count, followed_id)
+    db.session.commit()
+    return following, count
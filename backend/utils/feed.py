@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+首页关注流（推拉结合）
+普通作者发布文章时，通知扇出线程在同一批次里把文章写入每个关注者的时间线（推模式）；
+粉丝数达到阈值的作者不写入，读取时再按作者拉取最新文章，与时间线按 (发布时间, 文章ID) 倒序合并（拉模式）。
+每个用户的时间线只保留最近 FEED_MAX_ENTRIES 条，超出部分由 trim-feeds 任务清理
+"""
+
+from sqlalchemy import and_, or_
+
+from models import db, User, Post, Follow, FeedEntry
+from utils.counters import insert_ignore_many
+from utils.pagination import keyset_query, encode_cursor
+
+SORT_KEY = 'published_at:desc'
+
+class FeedTimeline:
+    """关注流的写入、读取与清理"""
+
+    def __init__(self, app=None):
+        self.max_entries = 500
+        self.pull_threshold = 10000
+        self.backfill_size = 20
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('FEED_MAX_ENTRIES', 500)
+        self.pull_threshold = app.config.get('FEED_PULL_THRESHOLD', 10000)
+        self.backfill_size = app.config.get('FEED_BACKFILL_SIZE', 20)
+
+    def is_pulled(self, followers_count):
+        """粉丝数达到阈值的作者改为读取时拉取"""
+        return (followers_count or 0) >= self.pull_threshold
+
+    def push(self, job, follower_ids):
+        """
+        通知扇出的批次回调：把新文章写入这一批关注者的时间线
+
+        文章和作者粉丝数只在任务的第一批查询一次，缓存在任务字典里
+        """
+        if job['type'] != 'new_post' or not job.get('post_id'):
+            return
+        if 'feed_post' not in job:
+            job['feed_post'] = db.session.query(Post.published_at, User.followers_count).join(
+                User, User.id == Post.author_id
+            ).filter(Post.id == job['post_id']).first()
+        post = job['feed_post']
+        if post is None or post.published_at is None or self.is_pulled(post.followers_count):
+            return
+        insert_ignore_many(FeedEntry.__table__, [{
+            'user_id': follower_id,
+            'post_id': job['post_id'],
+            'author_id': job['author_id'],
+            'published_at': post.published_at
+        } for follower_id in follower_ids])
+
+    def backfill(self, user_id, author_id):
+        """
+        关注后把作者最近的文章补进时间线（高粉作者在读取时拉取，不补）
+
+        Returns:
+            int: 补入的文章数
+        """
+        author = db.session.get(User, author_id)
+        if author is None or self.is_pulled(author.followers_count) or self.backfill_size <= 0:
+            return 0
+        rows = db.session.query(Post.id, Post.published_at).filter(
+            Post.author_id == author_id,
+            Post.status == 'published',
+            Post.published_at.isnot(None)
+        ).order_by(Post.published_at.desc(), Post.id.desc()).limit(self.backfill_size).all()
+        insert_ignore_many(FeedEntry.__table__, [{
+            'user_id': user_id,
+            'post_id': row.id,
+            'author_id': author_id,
+            'published_at': row.published_at
+        } for row in rows])
+        db.session.commit()
+        return len(rows)
+
+    def remove_author(self, user_id, author_id):
+        """取消关注后移除该作者在时间线中的文章"""
+        FeedEntry.query.filter_by(user_id=user_id, author_id=author_id).delete(synchronize_session=False)
+        db.session.commit()
+
+    def read(self, user_id, cursor, per_page):
+        """
+        读取一页关注流
+
+        时间线和高粉作者的文章各按游标取 per_page + 1 条，合并去重后取前 per_page + 1 条，
+        两边都只走 (用户/作者, 发布时间) 索引
+
+        Returns:
+            tuple: (文章列表, 下一页游标或None)
+
+        Raises:
+            InvalidCursor: 游标无效
+        """
+        limit = per_page + 1
+        pushed = db.session.query(FeedEntry.post_id, FeedEntry.published_at).join(
+            Post, Post.id == FeedEntry.post_id
+        ).filter(
+            FeedEntry.user_id == user_id,
+            Post.status == 'published',
+            # 取消关注与扇出并发时可能残留条目
+            db.session.query(Follow.id).filter(
+                Follow.follower_id == user_id,
+                Follow.followed_id == FeedEntry.author_id
+            ).exists()
+        )
+        rows = keyset_query(pushed, FeedEntry.published_at, FeedEntry.post_id, cursor, SORT_KEY).limit(limit).all()
+
+        pulled_author_ids = [row.id for row in db.session.query(User.id).join(
+            Follow, Follow.followed_id == User.id
+        ).filter(
+            Follow.follower_id == user_id,
+            User.followers_count >= self.pull_threshold
+        ).all()]
+        if pulled_author_ids:
+            pulled = db.session.query(Post.id.label('post_id'), Post.published_at).filter(
+                Post.author_id.in_(pulled_author_ids),
+                Post.status == 'published',
+                Post.published_at.isnot(None)
+            )
+            rows += keyset_query(pulled, Post.published_at, Post.id, cursor, SORT_KEY).limit(limit).all()
+
+        # 作者跨过阈值前后写入的文章可能两边都有，按文章ID去重
+        merged = {}
+        for row in rows:
+            merged.setdefault(row.post_id, row.published_at)
+        keys = sorted(((published_at, post_id) for post_id, published_at in merged.items()), reverse=True)[:limit]
+
+        next_cursor = None
+        if len(keys) > per_page:
+            keys = keys[:per_page]
+            next_cursor = encode_cursor(SORT_KEY, keys[-1][0], keys[-1][1])
+
+        post_ids = [post_id for _, post_id in keys]
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_(post_ids)).all()} if post_ids else {}
+        return [posts[post_id] for post_id in post_ids if post_id in posts], next_cursor
+
+    def trim(self):
+        """
+        删除超出保留条数的旧条目，以及文章已删除或已撤回的条目
+
+        Returns:
+            int: 删除的条目数
+        """
+        deleted = 0
+        user_ids = [row.user_id for row in db.session.query(FeedEntry.user_id).group_by(
+            FeedEntry.user_id
+        ).having(db.func.count() > self.max_entries).all()]
+        for user_id in user_ids:
+            boundary = db.session.query(FeedEntry.published_at, FeedEntry.post_id).filter(
+                FeedEntry.user_id == user_id
+            ).order_by(
+                FeedEntry.published_at.desc(), FeedEntry.post_id.desc()
+            ).offset(self.max_entries).first()
+            if boundary is None:
+                continue
+            deleted += FeedEntry.query.filter(
+                FeedEntry.user_id == user_id,
+                or_(
+                    FeedEntry.published_at < boundary.published_at,
+                    and_(FeedEntry.published_at == boundary.published_at, FeedEntry.post_id <= boundary.post_id)
+                )
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+        deleted += FeedEntry.query.filter(
+            ~db.session.query(Post.id).filter(
+                Post.id == FeedEntry.post_id,
+                Post.status == 'published'
+            ).exists()
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+feed_timeline = FeedTimeline()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HyperLogLog 基数估计
+用固定大小的寄存器数组估计去重数量，可序列化存库并按桶合并，
+用于浏览汇总中的独立用户数和独立IP数
+"""
+
+import hashlib
+import math
+
+class HyperLogLog:
+    """HyperLogLog 草图，precision=10 时占用1KB，标准误差约3.3%"""
+
+    def __init__(self, precision=10, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError('register size does not match precision')
+
+    @classmethod
+    def from_bytes(cls, data):
+        """从 to_bytes 的结果还原，空值返回空草图"""
+        if not data:
+            return cls()
+        data = bytes(data)
+        return cls(precision=data[0], registers=data[1:])
+
+    def to_bytes(self):
+        return bytes([self.precision]) + bytes(self.registers)
+
+    def add(self, value):
+        """加入一个元素（按字符串形式哈希）"""
+        digest = hashlib.sha1(str(value).encode('utf-8')).digest()
+        x = int.from_bytes(digest[:8], 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """合并另一个草图（取各寄存器最大值），返回自身"""
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches with different precision')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        """估计去重数量"""
+        m = self.size
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # 小基数时用线性计数修正
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知扇出与未读计数
+作者发布文章时，由后台线程分批读取关注者并批量插入通知，
+只给当前在线的关注者推送实时事件，发布请求不再随粉丝数线性变慢；
+扇出任务及进度保存在 notification_fanout_jobs 表，失败的批次会重试，进程重启后从断点继续；
+每个用户的未读数保存在 users.unread_notifications_count，随插入和已读原子增减；
+点赞、评论、关注等通知在时间窗口内按目标合并为一条（"X 等 N 人点赞了你的文章"），
+同一触发者重复触发只计一次；
+超过保留期的已读通知由保留任务分批移入归档表或删除
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from queue import Queue
+
+from sqlalchemy import insert, update, delete, select, bindparam
+
+from models import db, User, Follow, Notification, NotificationActor, NotificationArchive, NotificationFanoutJob
+from utils.counters import insert_ignore
+from utils.process_pool import is_pool_worker
+
+logger = logging.getLogger(__name__)
+
+# 可合并的通知类型及合并后的文案
+COALESCE_MESSAGES = {
+    'like': '{actor} 等 {count} 人点赞了你的文章《{title}》',
+    'new_comment': '{actor} 等 {count} 人评论了你的文章《{title}》',
+    'follow': '{actor} 等 {count} 人关注了你',
+}
+
+def group_key_for(type, post_id=None):
+    """通知的合并分组键，不可合并的类型返回None"""
+    if type not in COALESCE_MESSAGES:
+        return None
+    return f"{type}:{post_id or ''}"
+
+def record_actor(notification_id, actor_id):
+    """
+    记录合并通知的触发者（由调用方提交事务）
+
+    Returns:
+        bool: 是否为新的触发者；匿名事件总是计为新的
+    """
+    if actor_id is None:
+        return True
+    return insert_ignore(NotificationActor.__table__, {'notification_id': notification_id, 'actor_id': actor_id})
+
+def coalesce_notification(user_id, type, actor_id=None, post_id=None, comment_id=None, window=3600, push_interval=10):
+    """
+    把事件合并进窗口内同一分组的未读通知（由调用方提交事务）
+
+    同一触发者再次触发时只更新关联的评论，不增加人数也不推送
+
+    Args:
+        window (int): 合并窗口秒数，0表示不合并
+        push_interval (int): 同一条合并通知两次实时推送的最小间隔秒数
+
+    Returns:
+        tuple: (被合并的通知或None, 是否需要推送更新)
+    """
+    group_key = group_key_for(type, post_id)
+    if group_key is None or window <= 0:
+        return None, False
+
+    now = datetime.now(timezone.utc)
+    target = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.group_key == group_key,
+        Notification.is_read == False,
+        Notification.created_at >= now - timedelta(seconds=window)
+    ).order_by(Notification.id.desc()).first()
+    if target is None:
+        return None, False
+
+    if not record_actor(target.id, actor_id):
+        if comment_id:
+            Notification.query.filter_by(id=target.id).update({'comment_id': comment_id}, synchronize_session=False)
+            db.session.expire(target)
+        return target, False
+
+    actor = db.session.get(User, actor_id) if actor_id else None
+    message = COALESCE_MESSAGES[type].format(
+        actor=(actor.nickname or actor.username) if actor else '有人',
+        count=(target.actor_count or 1) + 1,
+        title=target.post.title if target.post else ''
+    )
+    last_update = target.updated_at or target.created_at
+    # 条件更新：并发请求已把这条通知标记为已读时不再合并
+    changed = Notification.query.filter(
+        Notification.id == target.id,
+        Notification.is_read == False
+    ).update({
+        'actor_count': Notification.actor_count + 1,
+        'actor_id': actor_id,
+        'comment_id': comment_id or target.comment_id,
+        'message': message,
+        'updated_at': now
+    }, synchronize_session=False)
+    if not changed:
+        return None, False
+    db.session.expire(target)
+
+    if last_update.tzinfo is None:
+        last_update = last_update.replace(tzinfo=timezone.utc)
+    return target, (now - last_update).total_seconds() >= push_interval
+
+def adjust_unread(user_ids, delta=1):
+    """
+    原子调整用户未读通知数（与通知写入放在同一事务中，由调用方提交）
+
+    Args:
+        user_ids (list): 用户ID列表，重复出现的ID会累加
+        delta (int): 每次出现的增量
+    """
+    counts = {}
+    for user_id in user_ids:
+        counts[user_id] = counts.get(user_id, 0) + delta
+    if not counts:
+        return
+    users = User.__table__
+    db.session.execute(update(users).where(
+        users.c.id == bindparam('b_user_id')
+    ).values(
+        unread_notifications_count=users.c.unread_notifications_count + bindparam('b_delta')
+    ), [{'b_user_id': user_id, 'b_delta': n} for user_id, n in counts.items()])
+
+def get_unread_counts(user_ids):
+    """批量读取用户未读通知数"""
+    if not user_ids:
+        return {}
+    rows = db.session.query(User.id, User.unread_notifications_count).filter(User.id.in_(user_ids)).all()
+    return {row.id: max(row.unread_notifications_count or 0, 0) for row in rows}
+
+def mark_read(user_id, notification_id):
+    """
+    把一条通知标记为已读，只有确实从未读变为已读时才扣减计数
+
+    Returns:
+        bool: 是否发生了变化
+    """
+    changed = Notification.query.filter_by(
+        id=notification_id, user_id=user_id, is_read=False
+    ).update({'is_read': True}, synchronize_session=False)
+    if changed:
+        adjust_unread([user_id], -changed)
+    db.session.commit()
+    return bool(changed)
+
+def mark_all_read(user_id):
+    """
+    用一条UPDATE把用户的全部未读通知标记为已读
+
+    Returns:
+        int: 标记的通知数
+    """
+    changed = Notification.query.filter_by(
+        user_id=user_id, is_read=False
+    ).update({'is_read': True}, synchronize_session=False)
+    if changed:
+        adjust_unread([user_id], -changed)
+    db.session.commit()
+    return changed
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'type', 'actor_id', 'post_id', 'actor_count', 'title', 'message', 'created_at')
+
+def archive_read_notifications(older_than_days, mode='archive', batch_size=1000, max_batches=None, pause=0):
+    """
+    把超过保留期的已读通知移入归档表（mode='delete' 时直接删除）
+
+    每批一个短事务：按ID取一批候选，复制到归档表后删除，
+    避免长时间持有锁；未读通知不受影响，因此未读计数无需调整
+
+    Args:
+        older_than_days (int): 保留天数
+        mode (str): archive 或 delete
+        batch_size (int): 每批处理的通知数
+        max_batches (int): 最多处理的批数，None表示处理完为止
+        pause (float): 两批之间的休眠秒数，给在线写入让出锁
+
+    Returns:
+        dict: 本次运行的指标
+    """
+    if mode not in ('archive', 'delete'):
+        raise ValueError(f"unknown retention mode: {mode}")
+    started = time.monotonic()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    notifications = Notification.__table__
+    archives = NotificationArchive.__table__
+    stats = {'mode': mode, 'cutoff': cutoff.isoformat(), 'batches': 0, 'archived': 0, 'deleted': 0}
+
+    while max_batches is None or stats['batches'] < max_batches:
+        ids = [row.id for row in db.session.execute(
+            select(notifications.c.id).where(
+                notifications.c.is_read == True,
+                notifications.c.created_at < cutoff
+            ).limit(batch_size)
+        )]
+        if not ids:
+            break
+        try:
+            if mode == 'archive':
+                columns = [notifications.c[name] for name in ARCHIVE_COLUMNS]
+                db.session.execute(
+                    insert(archives).from_select(list(ARCHIVE_COLUMNS), select(*columns).where(notifications.c.id.in_(ids)))
+                )
+                stats['archived'] += len(ids)
+            db.session.execute(delete(NotificationActor.__table__).where(NotificationActor.notification_id.in_(ids)))
+            stats['deleted'] += db.session.execute(
+                delete(notifications).where(notifications.c.id.in_(ids))
+            ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats['batches'] += 1
+        if pause:
+            time.sleep(pause)
+
+    stats['duration'] = round(time.monotonic() - started, 3)
+    logger.info(f"Notification retention run: {stats}")
+    return stats
+
+class NotificationFanout:
+    """关注者通知批量扇出"""
+
+    def __init__(self, app=None, **kwargs):
+        self.app = None
+        self.chunk_size = 1000
+        self.max_attempts = 3
+        self.retry_delay = 2
+        self.online_users = {}
+        self.socketio = None
+        self.queue = Queue()
+        self._listeners = []
+        self._thread = None
+        if app is not None:
+            self.init_app(app, **kwargs)
+
+    def init_app(self, app, online_users=None, socketio=None):
+        """
+        绑定应用并启动后台线程
+
+        Args:
+            app: Flask应用
+            online_users (dict): 在线用户表，键为字符串形式的用户ID
+            socketio: SocketIO实例，用于实时推送
+        """
+        self.app = app
+        self.chunk_size = app.config.get('NOTIFICATION_FANOUT_CHUNK_SIZE', 1000)
+        self.max_attempts = app.config.get('NOTIFICATION_FANOUT_MAX_ATTEMPTS', 3)
+        self.retry_delay = app.config.get('NOTIFICATION_FANOUT_RETRY_DELAY', 2)
+        if online_users is not None:
+            self.online_users = online_users
+        self.socketio = socketio
+        if self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='notification-fanout', daemon=True)
+            self._thread.start()
+
+    def on_chunk(self, listener):
+        """注册批次回调，参数为 (任务, 本批关注者ID列表)，与本批通知在同一事务中执行"""
+        self._listeners.append(listener)
+        return listener
+
+    def notify_followers(self, author_id, type, title, message, post_id=None):
+        """
+        保存扇出任务并放入队列，立即返回
+
+        Returns:
+            int: 任务ID
+        """
+        job = NotificationFanoutJob(
+            author_id=author_id,
+            type=type,
+            title=title,
+            message=message,
+            post_id=post_id
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.queue.put(job.id)
+        return job.id
+
+    def fanout(self, job_id):
+        """
+        执行一次扇出：从任务记录的进度开始按关注者ID分批插入通知
+
+        每批与任务进度在同一事务中提交，进度用条件更新推进，
+        多个进程同时续传同一任务时只有一个能提交；失败的批次按间隔重试，
+        重试耗尽后任务标记为 failed，可由 resume-fanout 命令重新执行
+
+        Returns:
+            int: 插入的通知数
+        """
+        record = db.session.get(NotificationFanoutJob, job_id)
+        if record is None or record.status == 'done':
+            return 0
+        job = {
+            'id': record.id,
+            'author_id': record.author_id,
+            'type': record.type,
+            'title': record.title,
+            'message': record.message,
+            'post_id': record.post_id,
+            'created_at': record.created_at
+        }
+        last_follower_id = record.last_follower_id or 0
+        attempts = 0
+        total = 0
+        while True:
+            try:
+                follower_ids, first_id = self._fanout_chunk(job, last_follower_id)
+            except _JobTaken:
+                db.session.rollback()
+                logger.info(f"Fanout job {job_id} is being processed elsewhere, stopping")
+                return total
+            except Exception as e:
+                db.session.rollback()
+                attempts += 1
+                logger.warning(
+                    f"Fanout job {job_id} chunk after follower {last_follower_id} failed "
+                    f"(attempt {attempts}/{self.max_attempts}): {str(e)}"
+                )
+                self._record_failure(job_id, str(e), final=attempts >= self.max_attempts)
+                if attempts >= self.max_attempts:
+                    raise
+                time.sleep(self.retry_delay * attempts)
+                continue
+
+            if not follower_ids:
+                NotificationFanoutJob.query.filter_by(id=job_id).delete(synchronize_session=False)
+                db.session.commit()
+                return total
+            attempts = 0
+            try:
+                self._emit_online(job, follower_ids, first_id)
+            except Exception as e:
+                # 通知已提交，推送失败只影响实时性
+                logger.warning(f"Failed to push fanout notifications for job {job_id}: {str(e)}")
+            total += len(follower_ids)
+            last_follower_id = follower_ids[-1]
+
+    def _fanout_chunk(self, job, last_follower_id):
+        """
+        插入一批通知并推进任务进度（同一事务）
+
+        Returns:
+            tuple: (本批关注者ID列表, 本批通知ID下界)
+        """
+        follower_ids = [row.follower_id for row in db.session.query(Follow.follower_id).filter(
+            Follow.followed_id == job['author_id'],
+            Follow.follower_id > last_follower_id
+        ).order_by(Follow.follower_id).limit(self.chunk_size).all()]
+        if not follower_ids:
+            return [], None
+
+        # 自增ID单调递增，本批插入的通知ID都大于插入前的最大ID
+        first_id = db.session.query(db.func.max(Notification.id)).scalar() or 0
+        db.session.execute(insert(Notification.__table__), [{
+            'user_id': follower_id,
+            'type': job['type'],
+            'title': job['title'],
+            'message': job['message'],
+            'actor_id': job['author_id'],
+            'post_id': job['post_id'],
+            'is_read': False,
+            'created_at': job['created_at'],
+            'updated_at': job['created_at']
+        } for follower_id in follower_ids])
+        adjust_unread(follower_ids)
+        for listener in self._listeners:
+            listener(job, follower_ids)
+        advanced = db.session.execute(update(NotificationFanoutJob.__table__).where(
+            NotificationFanoutJob.id == job['id'],
+            NotificationFanoutJob.last_follower_id == last_follower_id
+        ).values(
+            last_follower_id=follower_ids[-1],
+            status='pending',
+            updated_at=datetime.now(timezone.utc)
+        )).rowcount
+        if not advanced:
+            raise _JobTaken()
+        db.session.commit()
+        return follower_ids, first_id
+
+    def _record_failure(self, job_id, error, final=False):
+        """记录失败次数和原因，重试耗尽时标记为 failed"""
+        values = {
+            'attempts': NotificationFanoutJob.attempts + 1,
+            'last_error': error[:1000],
+            'updated_at': datetime.now(timezone.utc)
+        }
+        if final:
+            values['status'] = 'failed'
+        try:
+            NotificationFanoutJob.query.filter_by(id=job_id).update(values, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to record fanout job {job_id} failure: {str(e)}")
+
+    def resume(self, include_failed=False):
+        """
+        把未完成的任务重新放入队列（启动时调用）
+
+        Returns:
+            int: 放入队列的任务数
+        """
+        statuses = ['pending', 'failed'] if include_failed else ['pending']
+        job_ids = [row.id for row in db.session.query(NotificationFanoutJob.id).filter(
+            NotificationFanoutJob.status.in_(statuses)
+        ).order_by(NotificationFanoutJob.id).all()]
+        for job_id in job_ids:
+            self.queue.put(job_id)
+        return len(job_ids)
+
+    def _emit_online(self, job, follower_ids, first_id):
+        """只为在线关注者加载本批插入的通知并推送"""
+        if self.socketio is None:
+            return
+        online_ids = [uid for uid in follower_ids if str(uid) in self.online_users]
+        if not online_ids:
+            return
+        notifications = Notification.query.filter(
+            Notification.id > first_id,
+            Notification.user_id.in_(online_ids),
+            Notification.type == job['type'],
+            Notification.actor_id == job['author_id'],
+            Notification.post_id == job['post_id']
+        ).all()
+        for notification in notifications:
+            self.socketio.emit('new_notification', notification.to_dict(), room=f"user_{notification.user_id}")
+        self.push_unread(online_ids)
+
+    def push_unread(self, user_ids):
+        """向在线用户推送最新未读数（事件 unread_count）"""
+        if self.socketio is None:
+            return
+        online_ids = [uid for uid in user_ids if str(uid) in self.online_users]
+        for user_id, count in get_unread_counts(online_ids).items():
+            self.socketio.emit('unread_count', {'count': count}, room=f"user_{user_id}")
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                count = self.resume()
+                if count:
+                    logger.info(f"Resumed {count} unfinished fanout jobs")
+            except Exception as e:
+                # 数据表尚未创建等情况，只处理之后新建的任务
+                logger.warning(f"Failed to resume fanout jobs: {str(e)}")
+            finally:
+                db.session.remove()
+        while True:
+            job_id = self.queue.get()
+            with self.app.app_context():
+                try:
+                    count = self.fanout(job_id)
+                    logger.info(f"Fanned out {count} notifications for job {job_id}")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Notification fanout job {job_id} failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+class _JobTaken(Exception):
+    """任务进度已被其他进程推进"""
+
+notification_fanout = NotificationFanout()
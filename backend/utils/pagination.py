@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页工具函数
+用 (排序字段, id) 作为游标定位下一页，不使用OFFSET，也不在每页执行COUNT(*)；
+总数按需从带过期时间的计数缓存读取
+"""
+
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+class InvalidCursor(ValueError):
+    """游标格式错误或与当前排序方式不匹配"""
+
+def encode_cursor(sort_key, value, row_id):
+    """
+    生成不透明游标
+
+    Args:
+        sort_key (str): 排序方式名称，用于校验游标是否属于当前查询
+        value: 最后一条记录的排序字段值
+        row_id (int): 最后一条记录的ID
+
+    Returns:
+        str: URL安全的游标字符串
+    """
+    payload = {'k': sort_key, 'id': row_id}
+    if isinstance(value, datetime):
+        payload['t'] = value.isoformat()
+    else:
+        payload['v'] = value
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_key):
+    """
+    解析游标
+
+    Returns:
+        tuple: (排序字段值, 记录ID)
+
+    Raises:
+        InvalidCursor: 游标无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload.get('k') != sort_key:
+            raise InvalidCursor('cursor does not match sort order')
+        value = datetime.fromisoformat(payload['t']) if 't' in payload else payload.get('v')
+        return value, int(payload['id'])
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+def keyset_query(query, sort_column, id_column, cursor, sort_key, descending=True):
+    """
+    在查询上应用游标条件和 (sort_column, id_column) 排序
+
+    Raises:
+        InvalidCursor: 游标无效
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key)
+        if descending:
+            query = query.filter(or_(
+                sort_column < value,
+                and_(sort_column == value, id_column < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                sort_column > value,
+                and_(sort_column == value, id_column > last_id)
+            ))
+
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+def keyset_paginate(query, sort_column, id_column, cursor, per_page, sort_key, descending=True):
+    """
+    按 (sort_column, id_column) 做游标分页
+
+    Args:
+        query: 已应用过滤条件、未排序的查询对象
+        sort_column: 排序字段
+        id_column: 主键字段，用于排序值相同时的稳定排序
+        cursor (str): 上一页返回的游标，为空表示第一页
+        per_page (int): 每页数量
+        sort_key (str): 排序方式名称
+        descending (bool): 是否倒序
+
+    Returns:
+        tuple: (本页记录列表, 下一页游标或None)
+
+    Raises:
+        InvalidCursor: 游标无效
+    """
+    query = keyset_query(query, sort_column, id_column, cursor, sort_key, descending)
+    rows = query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key, getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+class CountCache:
+    """列表总数缓存，过期前返回上次的计数（近似值）"""
+
+    def __init__(self, ttl=60, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, query):
+        """
+        获取查询结果总数
+
+        Args:
+            key (str): 缓存键，应包含所有过滤条件
+            query: 未排序的查询对象，缓存失效时用于COUNT
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item and item[0] > now:
+                return item[1]
+        total = query.order_by(None).count()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (now + self.ttl, total)
+        return total
+
+    def invalidate(self, prefix=''):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+count_cache = CountCache()
+
+def count_cache_key(prefix, args, *extra):
+    """由过滤参数生成计数缓存键，忽略分页和排序参数"""
+    ignored = {'cursor', 'page', 'per_page', 'sort_by', 'order', 'with_total'}
+    filters = sorted((k, v) for k, v in args.items() if k not in ignored and v != '')
+    return json.dumps([prefix, filters, list(extra)], ensure_ascii=False, default=str)
+
+def cursor_page(query, sort_column, id_column, args, per_page, sort_key, descending=True, count_key=None):
+    """
+    按请求参数执行游标分页并生成分页信息
+
+    Returns:
+        tuple: (本页记录列表, 分页信息字典)
+
+    Raises:
+        InvalidCursor: 游标无效
+    """
+    rows, next_cursor = keyset_paginate(
+        query, sort_column, id_column, args.get('cursor', ''), per_page, sort_key, descending
+    )
+    pagination = {
+        'per_page': per_page,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    }
+    if count_key and wants_total(args):
+        pagination['total'] = count_cache.get(count_key, query)
+    return rows, pagination
+
+def cursor_requested(args):
+    """请求中带有cursor参数（可为空，表示第一页）即启用游标分页"""
+    return 'cursor' in args
+
+def wants_total(args):
+    """游标模式下默认不返回总数，with_total=true时从计数缓存返回"""
+    return args.get('with_total', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密码哈希进程池
+注册、登录、改密码时的PBKDF2/scrypt计算放到子进程执行，请求线程只等待结果；
+同时计算的进程数和排队中的任务数都有上限，登录洪峰时多出的请求直接返回503，不再占满所有worker拖慢普通页面；
+超时的子进程直接终止，不会长期占用计算名额。
+哈希参数可配置，参数变化后用户下次登录成功时自动按新参数重新哈希
+"""
+
+import logging
+import threading
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+def normalize_method(method):
+    """
+    把哈希方法配置补全为werkzeug写入哈希前缀的形式（与 werkzeug 2.3 的默认参数一致）
+
+    例如 pbkdf2 -> pbkdf2:sha256:600000，scrypt -> scrypt:32768:8:1
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args[:3]) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+class PasswordHasherBusy(ServiceUnavailable):
+    """哈希任务排队已满或等待超时"""
+    description = '请求过多，请稍后再试'
+
+class PasswordHasher:
+    """有界的密码哈希子进程调度"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.method = 'pbkdf2:sha256:600000'
+        self.salt_length = 16
+        self.max_workers = 2
+        self.max_pending = 32
+        self.timeout = 10
+        self._method_prefix = normalize_method(self.method)
+        self._slots = None
+        self._workers = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', 16)
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.max_pending = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 32)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self._method_prefix = normalize_method(self.method)
+        # 正在计算和排队的任务总数上限
+        self._slots = threading.BoundedSemaphore(max(self.max_workers, 0) + max(self.max_pending, 0))
+        # 同时计算的子进程数上限
+        self._workers = threading.BoundedSemaphore(max(self.max_workers, 1))
+
+    def _run(self, fn, *args):
+        """
+        在子进程中执行并等待结果；未初始化或 PASSWORD_HASH_WORKERS=0 时同步执行
+
+        Raises:
+            PasswordHasherBusy: 排队已满、等待计算名额超时或计算超时
+        """
+        if self.app is None or self.max_workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Password hash pool is saturated, rejecting request")
+            raise PasswordHasherBusy()
+        try:
+            if not self._workers.acquire(timeout=self.timeout):
+                logger.warning(f"Password hashing waited more than {self.timeout}s for a worker")
+                raise PasswordHasherBusy()
+            try:
+                return run_in_process(fn, args, timeout=self.timeout, preload=('werkzeug.security',))
+            except TimeoutError:
+                logger.warning(f"Password hashing timed out after {self.timeout}s, worker terminated")
+                raise PasswordHasherBusy()
+            finally:
+                self._workers.release()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """按当前配置生成密码哈希"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """校验密码，哈希参数取自已保存的哈希本身"""
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """已保存的哈希与当前配置的算法、参数或盐长度不一致"""
+        if not pwhash or pwhash.count('$') != 2:
+            return True
+        method, salt, _ = pwhash.split('$')
+        return method != self._method_prefix or len(salt) != self.salt_length
+
+password_hasher = PasswordHasher()
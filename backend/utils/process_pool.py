@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程池的子进程启动方式
+Web进程里有数据库连接池、SocketIO和多个后台线程，直接 fork 会把其他线程持有的锁一起复制到子进程；
+进程池改用 forkserver（平台不支持时用 spawn）启动子进程，forkserver 预加载任务需要的模块。
+两种方式下子进程都会以 __mp_main__ 重新导入主脚本（如 python app.py 时的 app.py），
+因此各后台线程在启动前用 is_pool_worker 判断，进程池子进程中不启动。
+进程池中正在执行的任务无法取消，有超时要求的任务用 run_in_process 在独立子进程中执行，超时即终止该进程
+"""
+
+import multiprocessing
+import threading
+
+_preload = set()
+_lock = threading.Lock()
+
+def is_pool_worker():
+    """
+    当前进程是否为 multiprocessing 启动的子进程
+
+    子进程导入主脚本时 parent_process() 尚未设置，但进程名已改为子进程名
+    """
+    return multiprocessing.parent_process() is not None or multiprocessing.current_process().name != 'MainProcess'
+
+def process_pool_context(*preload):
+    """
+    返回创建 ProcessPoolExecutor 时使用的 multiprocessing 上下文
+
+    Args:
+        preload: forkserver 启动时预先导入的模块名，各进程池的模块合并后一起预加载
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    with _lock:
+        _preload.update(preload)
+        context.set_forkserver_preload(sorted(_preload))
+    return context
+
+def _call(sender, fn, args):
+    """子进程入口：执行任务并把 (是否成功, 结果或异常) 发回父进程"""
+    try:
+        result = (True, fn(*args))
+    except Exception as e:
+        result = (False, e)
+    try:
+        sender.send(result)
+    except Exception:
+        # 结果或异常无法序列化
+        sender.send((False, RuntimeError(repr(result[1]))))
+    finally:
+        sender.close()
+
+def run_in_process(fn, args=(), timeout=None, preload=()):
+    """
+    在独立子进程中执行 fn(*args) 并等待结果，超时后终止子进程
+
+    Args:
+        fn: 模块级函数（需能被子进程导入）
+        args (tuple): 参数
+        timeout (float): 从子进程启动时算起的超时秒数，None表示不限
+        preload: forkserver 预加载的模块名
+
+    Raises:
+        TimeoutError: 超时，子进程已被终止
+        Exception: 任务抛出的异常，或子进程异常退出时的 RuntimeError
+    """
+    context = process_pool_context(*preload)
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_call, args=(sender, fn, args), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise TimeoutError(f'{getattr(fn, "__name__", fn)} timed out after {timeout}s')
+        try:
+            ok, value = receiver.recv()
+        except EOFError:
+            process.join()
+            raise RuntimeError(f'worker process exited with code {process.exitcode}')
+        if not ok:
+            raise value
+        return value
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        receiver.close()
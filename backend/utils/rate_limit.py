@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+接口限流
+滑动窗口计数（当前窗口计数 + 上一窗口计数按剩余比例加权），分别按客户端IP和按账号计数；
+计数默认保存在进程内，多worker部署时可换成Redis共享；检查和计数在锁内（Redis中用Lua脚本）原子完成。
+装饰器在视图函数之前执行，超出限制的请求直接返回429，不查库也不计算密码哈希
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify
+
+try:
+    import redis
+except ImportError:  # Redis为可选依赖
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_limit(value):
+    """
+    解析限流规则
+
+    Args:
+        value (str): 形如 "10/minute"、"5/hour" 或 "100/60"（秒数）
+
+    Returns:
+        tuple: (次数, 窗口秒数)
+    """
+    count, _, period = value.partition('/')
+    period = period.strip().lower()
+    seconds = PERIODS.get(period.rstrip('s')) if not period.isdigit() else int(period)
+    if not seconds:
+        raise ValueError(f'invalid rate limit: {value}')
+    return int(count), seconds
+
+class MemoryRateLimitBackend:
+    """
+    进程内计数，条目按最近使用排序；条目过多时从最久未使用的一端淘汰，
+    已达上限、正在拦截请求的计数不淘汰，用大量不同账号名填满计数表也冲不掉被攻击账号的计数
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        # 键 -> (过期时间, 次数, 次数上限)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._entries.get(key)
+        if item is None or item[0] < now:
+            return 0
+        self._entries.move_to_end(key)
+        return item[1]
+
+    def acquire(self, checks):
+        """
+        在同一把锁内检查所有规则，全部未超限时才一起计数
+
+        Args:
+            checks (list): [(当前窗口键, 上一窗口键, 上一窗口权重, 次数上限, 过期秒数)]
+
+        Returns:
+            int: 第一个超限规则的下标，全部允许时返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            for i, (current_key, previous_key, weight, limit, _) in enumerate(checks):
+                if self._get(previous_key, now) * weight + self._get(current_key, now) >= limit:
+                    return i
+            for current_key, _, _, limit, ttl in checks:
+                item = self._entries.get(current_key)
+                if item is None or item[0] < now:
+                    if item is None and len(self._entries) >= self.max_entries:
+                        self._evict(now)
+                    item = (now + ttl, 0, limit)
+                self._entries[current_key] = (item[0], item[1] + 1, limit)
+                self._entries.move_to_end(current_key)
+            return None
+
+    def _evict(self, now):
+        """从最久未使用的一端淘汰，直到有空位；跳过仍在窗口内且已达上限的计数"""
+        for _ in range(len(self._entries)):
+            if len(self._entries) < self.max_entries:
+                return
+            key, item = self._entries.popitem(last=False)
+            expires_at, count, limit = item
+            if expires_at >= now and count >= limit:
+                self._entries[key] = item
+        # 全部都是正在拦截的计数时才淘汰最久未使用的一条
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# 与 MemoryRateLimitBackend.acquire 相同的判断，在Redis中原子执行；
+# KEYS 依次为每条规则的当前/上一窗口键，ARGV 依次为每条规则的权重/上限/过期秒数
+_ACQUIRE_SCRIPT = """
+local n = #KEYS / 2
+for i = 1, n do
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    if previous * tonumber(ARGV[3 * i - 2]) + current >= tonumber(ARGV[3 * i - 1]) then
+        return i
+    end
+end
+for i = 1, n do
+    redis.call('INCR', KEYS[2 * i - 1])
+    redis.call('EXPIRE', KEYS[2 * i - 1], ARGV[3 * i])
+end
+return 0
+"""
+
+class RedisRateLimitBackend:
+    """Redis共享计数，多个worker进程共用限额"""
+
+    def __init__(self, url, prefix='blog:ratelimit:'):
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._acquire = self._redis.register_script(_ACQUIRE_SCRIPT)
+
+    def acquire(self, checks):
+        keys = []
+        args = []
+        for current_key, previous_key, weight, limit, ttl in checks:
+            keys.extend([self._prefix + current_key, self._prefix + previous_key])
+            args.extend([repr(weight), limit, max(int(ttl), 1)])
+        failed = int(self._acquire(keys=keys, args=args))
+        return failed - 1 if failed else None
+
+    def clear(self):
+        for key in self._redis.scan_iter(f"{self._prefix}*"):
+            self._redis.delete(key)
+
+class RateLimiter:
+    """滑动窗口限流器"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.backend = MemoryRateLimitBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        if app.config.get('RATE_LIMIT_BACKEND') == 'redis':
+            url = app.config.get('RATE_LIMIT_REDIS_URL')
+            if redis is None or not url:
+                logger.warning("Redis rate limit backend unavailable, falling back to memory")
+            else:
+                self.backend = RedisRateLimitBackend(url)
+                return
+        self.backend = MemoryRateLimitBackend()
+
+    def hit(self, rules):
+        """
+        按滑动窗口检查并计数一次
+
+        任一规则超限时整个请求被拒绝，所有规则都不计数
+
+        Args:
+            rules (list): [(计数键, 次数上限, 窗口秒数)]
+
+        Returns:
+            int: 被限流时需等待的秒数，允许时返回0
+        """
+        now = time.time()
+        checks = []
+        for key, limit, window in rules:
+            index = int(now // window)
+            elapsed = now - index * window
+            checks.append((f"{key}:{index}", f"{key}:{index - 1}", 1 - elapsed / window, limit, window * 2))
+        failed = self.backend.acquire(checks)
+        if failed is None:
+            return 0
+        window = rules[failed][2]
+        return max(int(math.ceil(window - now % window)), 1)
+
+    def _resolve(self, name, default):
+        """规则可由配置项 RATE_LIMIT_<NAME> 覆盖"""
+        value = self.app.config.get(f'RATE_LIMIT_{name.upper()}') if self.app else None
+        return parse_limit(value or default)
+
+    def limit(self, scope, per_ip, per_account=None, account=None):
+        """
+        限流装饰器
+
+        Args:
+            scope (str): 限流范围名称，同时决定覆盖配置项名（如 login -> RATE_LIMIT_LOGIN）
+            per_ip (str): 每个IP的默认规则
+            per_account (str): 每个账号的默认规则（配置项 RATE_LIMIT_<SCOPE>_ACCOUNT）
+            account (callable): 从请求中取账号标识（用户名或邮箱）的函数
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                count, window = self._resolve(scope, per_ip)
+                rules = [(f"{scope}:ip:{_client_ip()}", count, window)]
+                if per_account and account is not None:
+                    value = (account() or '').strip().lower()
+                    if value:
+                        count, window = self._resolve(f'{scope}_account', per_account)
+                        rules.append((f"{scope}:account:{value}", count, window))
+
+                retry_after = self.hit(rules)
+                if retry_after:
+                    response = jsonify({
+                        'message': '请求过于频繁，请稍后再试',
+                        'error': 'rate_limited',
+                        'retry_after': retry_after
+                    })
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response
+                return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+rate_limiter = RateLimiter()
+
+def _client_ip():
+    """客户端IP；反向代理后部署时由 ProxyFix 按 TRUSTED_PROXY_COUNT 从 X-Forwarded-For 还原"""
+    return request.remote_addr or 'unknown'
+
+def json_field(name):
+    """取请求JSON中的字段，供 account 参数使用"""
+    return lambda: str((request.get_json(silent=True) or {}).get(name) or '')
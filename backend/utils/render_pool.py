@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大文章Markdown异步渲染
+超过阈值的正文先保存、标记为 pending，由子进程在请求之外渲染，
+完成后回写 content_html 并把 render_status 改为 ready（超时或出错为 failed）；
+同时渲染的进程数不超过 RENDER_WORKERS，每篇文章一个子进程，超时从子进程启动时算起，
+超时的子进程直接终止，不会长期占用渲染名额
+"""
+
+import logging
+import threading
+
+from models import db, Post
+from utils.renderer import render_markdown, render_markdown_uncached, render_cache
+from utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+class RenderPool:
+    """Markdown渲染子进程调度"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.threshold = 20000
+        self.timeout = 30
+        self.max_workers = 2
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold = app.config.get('RENDER_ASYNC_THRESHOLD', 20000)
+        self.timeout = app.config.get('RENDER_TIMEOUT', 30)
+        self.max_workers = app.config.get('RENDER_WORKERS', 2)
+        self._slots = threading.BoundedSemaphore(max(self.max_workers, 1))
+
+    def prepare(self, post, content):
+        """
+        为文章设置渲染结果
+
+        小文章或缓存命中时同步写入 content_html；大文章标记为 pending，
+        需在事务提交后调用 submit
+
+        Returns:
+            bool: 是否需要异步渲染
+        """
+        cached = render_cache.get(render_cache.key(content)) if content else ''
+        if cached is not None:
+            post.content_html = cached
+            post.render_status = 'ready'
+            return False
+        if self.app is None or len(content) < self.threshold:
+            post.content_html = render_markdown(content)
+            post.render_status = 'ready'
+            return False
+        post.render_status = 'pending'
+        return True
+
+    def submit(self, post_id, content):
+        """提交异步渲染任务，由守护线程等待渲染名额、执行并回写数据库"""
+        threading.Thread(
+            target=self._render, args=(post_id, content),
+            name=f'render-post-{post_id}', daemon=True
+        ).start()
+
+    def _render(self, post_id, content):
+        with self._slots:
+            try:
+                html = run_in_process(
+                    render_markdown_uncached, (content,),
+                    timeout=self.timeout, preload=('utils.renderer',)
+                )
+            except TimeoutError:
+                logger.warning(f"Rendering post {post_id} timed out after {self.timeout}s, worker terminated")
+                self._save(post_id, content, None, 'failed')
+                return
+            except Exception as e:
+                logger.error(f"Rendering post {post_id} failed: {str(e)}")
+                self._save(post_id, content, None, 'failed')
+                return
+        render_cache.set(render_cache.key(content), html)
+        self._save(post_id, content, html, 'ready')
+
+    def _save(self, post_id, content, html, status):
+        """回写渲染结果；正文已被再次修改时丢弃过期结果"""
+        with self.app.app_context():
+            try:
+                values = {'render_status': status}
+                if html is not None:
+                    values['content_html'] = html
+                Post.query.filter(
+                    Post.id == post_id,
+                    Post.content == content
+                ).update(values, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to save rendered html for post {post_id}: {str(e)}")
+
+render_pool = RenderPool()
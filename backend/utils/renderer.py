@@ -4,9 +4,18 @@
 Markdown rendering helpers with sanitization.
 """
 
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
 import markdown2
 import bleach
 
+logger = logging.getLogger(__name__)
+
 # Allow basic formatting, code blocks, tables and images.
 ALLOWED_TAGS = list(bleach.sanitizer.ALLOWED_TAGS) + [
     'p', 'pre', 'code', 'span', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
@@ -23,26 +32,129 @@ ALLOWED_ATTRIBUTES = {
     'td': ['colspan', 'rowspan'],
 }
 ALLOWED_PROTOCOLS = list(bleach.sanitizer.ALLOWED_PROTOCOLS) + ['data']
+MARKDOWN_EXTRAS = [
+    'fenced-code-blocks',
+    'tables',
+    'strike',
+    'cuddled-lists',
+    'code-friendly',
+    'break-on-newline',
+    'header-ids',
+    'spoiler',
+]
 
 
-def render_markdown(content: str) -> str:
-    """Convert Markdown to sanitized HTML."""
+def renderer_fingerprint() -> str:
+    """Hash of everything that affects rendered output.
+
+    Changing the extras or the sanitizer policy changes the fingerprint, so
+    cached HTML produced under the old policy is never served again.
+    """
+    config = {
+        'markdown2': getattr(markdown2, '__version__', ''),
+        'bleach': getattr(bleach, '__version__', ''),
+        'extras': sorted(MARKDOWN_EXTRAS),
+        'tags': sorted(set(ALLOWED_TAGS)),
+        'attributes': {k: sorted(v) for k, v in ALLOWED_ATTRIBUTES.items()},
+        'protocols': sorted(set(ALLOWED_PROTOCOLS)),
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class RenderCache:
+    """Content-addressed LRU cache of sanitized HTML, optionally persisted to disk."""
+
+    def __init__(self, max_entries=2048, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.fingerprint = renderer_fingerprint()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries=None, cache_dir=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            self.cache_dir = cache_dir
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._evict()
+
+    def key(self, content: str) -> str:
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        return f"{self.fingerprint}-{digest}"
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+        html = self._read_disk(key)
+        with self._lock:
+            if html is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, html)
+        return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._store(key, html)
+        self._write_disk(key, html)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, html):
+        self._entries[key] = html
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:19], f"{key}.html")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, html):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to persist rendered markdown: {str(e)}")
+
+
+render_cache = RenderCache()
+
+
+def render_markdown_uncached(content: str) -> str:
+    """Convert Markdown to sanitized HTML without consulting the cache."""
     if not content:
         return ''
 
-    html = markdown2.markdown(
-        content,
-        extras=[
-            'fenced-code-blocks',
-            'tables',
-            'strike',
-            'cuddled-lists',
-            'code-friendly',
-            'break-on-newline',
-            'header-ids',
-            'spoiler',
-        ],
-    )
+    html = markdown2.markdown(content, extras=MARKDOWN_EXTRAS)
     cleaned = bleach.clean(
         html,
         tags=ALLOWED_TAGS,
@@ -51,3 +163,46 @@ def render_markdown(content: str) -> str:
         strip=True,
     )
     return cleaned
+
+
+def render_markdown(content: str) -> str:
+    """Convert Markdown to sanitized HTML, reusing cached output for identical source."""
+    if not content:
+        return ''
+
+    key = render_cache.key(content)
+    html = render_cache.get(key)
+    if html is None:
+        html = render_markdown_uncached(content)
+        render_cache.set(key, html)
+    return html
+
+
+def render_pool_executor(workers=None):
+    """Create a process pool for render_many that can be reused across batches."""
+    from concurrent.futures import ProcessPoolExecutor
+    from utils.process_pool import process_pool_context
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=process_pool_context('utils.renderer'))
+
+
+def render_many(contents, workers=None, chunksize=16, pool=None):
+    """Render a batch of Markdown sources in a process pool.
+
+    Pass ``pool`` (see render_pool_executor) when rendering many batches so
+    the worker processes are started once; otherwise a pool is created for
+    this call. Returns the sanitized HTML in input order. Results are also
+    stored in the render cache of the calling process.
+    """
+    contents = list(contents)
+    if not contents:
+        return []
+    if pool is None:
+        with render_pool_executor(workers) as pool:
+            results = list(pool.map(render_markdown_uncached, contents, chunksize=chunksize))
+    else:
+        results = list(pool.map(render_markdown_uncached, contents, chunksize=chunksize))
+    for content, html in zip(contents, results):
+        if content:
+            render_cache.set(render_cache.key(content), html)
+    return results
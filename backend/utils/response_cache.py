@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+匿名只读接口响应缓存
+按 接口 + 规范化查询参数 缓存整个响应（进程内LRU+TTL，可换成Redis共享），
+文章/标签/分类写入提交后通过分组版本号失效，并支持 ETag / If-None-Match 返回304
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, Response, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Post, Tag, Category
+
+try:
+    import redis
+except ImportError:  # Redis为可选依赖
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryCacheBackend:
+    """进程内LRU缓存，条目带过期时间"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr_counter(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisCacheBackend:
+    """Redis共享缓存，多个worker进程共用缓存和失效版本号"""
+
+    def __init__(self, url, prefix='blog:resp:'):
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value, ttl):
+        self._redis.setex(self._prefix + key, max(int(ttl), 1), json.dumps(value))
+
+    def get_counter(self, name):
+        return int(self._redis.get(f"{self._prefix}gen:{name}") or 0)
+
+    def incr_counter(self, name):
+        self._redis.incr(f"{self._prefix}gen:{name}")
+
+    def clear(self):
+        for key in self._redis.scan_iter(f"{self._prefix}*"):
+            self._redis.delete(key)
+
+class ResponseCache:
+    """响应缓存，按失效分组维护版本号"""
+
+    def __init__(self, app=None):
+        self.backend = MemoryCacheBackend()
+        self.default_ttl = 60
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        if app.config.get('RESPONSE_CACHE_BACKEND') == 'redis':
+            url = app.config.get('RESPONSE_CACHE_REDIS_URL')
+            if redis is None or not url:
+                logger.warning("Redis response cache backend unavailable, falling back to memory")
+            else:
+                self.backend = RedisCacheBackend(url)
+                return
+        self.backend = MemoryCacheBackend(app.config.get('RESPONSE_CACHE_SIZE', 1000))
+
+    def invalidate(self, *groups):
+        """使分组下所有缓存失效（版本号加一，旧键自然过期）"""
+        for group in groups:
+            self.backend.incr_counter(group)
+
+    def make_key(self, groups):
+        """接口名 + 排序后的非空查询参数 + 分组版本号"""
+        args = sorted(
+            (k, v) for k, values in request.args.lists() for v in values if v != ''
+        )
+        versions = [self.backend.get_counter(group) for group in groups]
+        raw = json.dumps([request.endpoint, args, versions], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def cached(self, groups, ttl=None):
+        """
+        缓存匿名请求的响应
+
+        带 Authorization 头的请求（结果可能因用户而异）直接透传
+
+        Args:
+            groups (tuple): 失效分组，如 ('posts',)
+            ttl (int): 过期秒数，默认 RESPONSE_CACHE_TTL
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.headers.get('Authorization'):
+                    return f(*args, **kwargs)
+
+                key = self.make_key(groups)
+                entry = self.backend.get(key)
+                if entry is None:
+                    self.misses += 1
+                    response = current_app.make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body.decode('utf-8'),
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha1(body).hexdigest()
+                    }
+                    self.backend.set(key, entry, ttl or self.default_ttl)
+                else:
+                    self.hits += 1
+
+                etag = entry['etag']
+                if etag in request.if_none_match:
+                    response = Response(status=304)
+                else:
+                    response = Response(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+                return response
+            return wrapper
+        return decorator
+
+response_cache = ResponseCache()
+
+# 写入哪类对象需要失效哪些分组；文章字典内嵌标签和分类，因此它们变化时文章列表也失效
+_INVALIDATION_GROUPS = {
+    Post: ('posts',),
+    Tag: ('tags', 'posts'),
+    Category: ('categories', 'posts'),
+}
+
+def invalidate_on_commit(session, *groups):
+    """登记需在事务提交后失效的分组，供绕过ORM直接执行SQL的写入使用"""
+    session.info.setdefault('response_cache_groups', set()).update(groups)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    groups = session.info.setdefault('response_cache_groups', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        groups.update(_INVALIDATION_GROUPS.get(type(obj), ()))
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    groups = session.info.pop('response_cache_groups', None)
+    if groups:
+        response_cache.invalidate(*groups)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('response_cache_groups', None)
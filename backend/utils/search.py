@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章全文检索
+SQLite 使用 FTS5 虚拟表 posts_fts（应用层对中文做单字+双字切分），
+MySQL 使用 ngram 解析器的 FULLTEXT 索引；两者都按相关度排序，
+索引不可用时回退到 LIKE 查询
+"""
+
+import logging
+import re
+
+from flask import current_app
+from sqlalchemy import event, text, or_, desc, inspect
+
+from models import db, Post
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'posts_fts'
+MYSQL_FULLTEXT_INDEX = 'ft_posts_title_summary_content'
+
+# BM25 列权重：标题 > 摘要 > 正文
+BM25_WEIGHTS = (10.0, 4.0, 1.0)
+
+_TOKEN_RE = re.compile(r'[一-龥]+|[a-zA-Z0-9]+')
+_CJK_RE = re.compile(r'[一-龥]')
+
+# 每个数据库引擎的索引可用状态缓存
+_index_ready = {}
+
+def tokenize(content, for_query=False):
+    """
+    切分文本为检索词
+
+    英文数字按单词小写；连续中文切成单字和相邻双字（建索引时），
+    查询时只用双字（单字查询用单字），以兼顾召回与精度
+
+    Args:
+        content (str): 原始文本
+        for_query (bool): 是否为查询切分
+
+    Returns:
+        list: 检索词列表
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(content or ''):
+        if not _CJK_RE.match(run):
+            tokens.append(run.lower())
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if for_query:
+            tokens.extend(bigrams)
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+    return tokens
+
+def build_match_expression(search):
+    """把查询串转成 FTS5 MATCH 表达式（所有词同时命中）"""
+    tokens = []
+    for token in tokenize(search, for_query=True):
+        if token not in tokens:
+            tokens.append(token)
+    if not tokens:
+        return ''
+    # 最后一个英文词做前缀匹配，便于边输入边搜索
+    parts = [f'"{token}"' for token in tokens]
+    if not _CJK_RE.match(tokens[-1]):
+        parts[-1] += '*'
+    return ' AND '.join(parts)
+
+def _dialect(bind=None):
+    return (bind or db.engine).dialect.name
+
+def _engine_key(connection):
+    return str(connection.engine.url)
+
+def _probe_index(connection):
+    """检查当前数据库的检索索引是否存在，结果按引擎缓存"""
+    key = _engine_key(connection)
+    if key in _index_ready:
+        return _index_ready[key]
+    dialect = connection.dialect.name
+    try:
+        if dialect == 'sqlite':
+            ready = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first() is not None
+        elif dialect == 'mysql':
+            ready = connection.execute(
+                text("SELECT 1 FROM information_schema.statistics "
+                     "WHERE table_schema = DATABASE() AND table_name = 'posts' AND index_name = :name"),
+                {'name': MYSQL_FULLTEXT_INDEX}
+            ).first() is not None
+        else:
+            ready = False
+    except Exception as e:
+        logger.warning(f"Search index probe failed: {str(e)}")
+        ready = False
+    _index_ready[key] = ready
+    return ready
+
+def is_search_index_ready():
+    """检索索引是否可用"""
+    with db.engine.connect() as connection:
+        return _probe_index(connection)
+
+def ensure_search_index():
+    """
+    创建检索索引（已存在时跳过）
+
+    Returns:
+        bool: 索引是否可用
+    """
+    dialect = _dialect()
+    try:
+        with db.engine.begin() as connection:
+            if dialect == 'sqlite':
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(title, summary, content, tokenize = 'unicode61')"
+                ))
+            elif dialect == 'mysql':
+                _index_ready.pop(_engine_key(connection), None)
+                if not _probe_index(connection):
+                    connection.execute(text(
+                        f"ALTER TABLE posts ADD FULLTEXT INDEX {MYSQL_FULLTEXT_INDEX} "
+                        f"(title, summary, content) WITH PARSER ngram"
+                    ))
+            else:
+                return False
+            _index_ready[_engine_key(connection)] = True
+            return True
+    except Exception as e:
+        # 例如SQLite编译时未启用FTS5
+        logger.warning(f"Full-text search index unavailable: {str(e)}")
+        return False
+
+def rebuild_search_index():
+    """
+    全量重建 SQLite 检索索引（MySQL 由数据库自动维护）
+
+    Returns:
+        int: 已索引的文章数
+    """
+    if not ensure_search_index():
+        return 0
+    if _dialect() != 'sqlite':
+        return Post.query.count()
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    count = 0
+    for post in Post.query.yield_per(500):
+        _index_row(db.session.connection(), post.id, post.title, post.summary, post.content)
+        count += 1
+    db.session.commit()
+    return count
+
+def _index_row(connection, post_id, title, summary, content):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': post_id})
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, title, summary, content) "
+             f"VALUES (:id, :title, :summary, :content)"),
+        {
+            'id': post_id,
+            'title': ' '.join(tokenize(title)),
+            'summary': ' '.join(tokenize(summary)),
+            'content': ' '.join(tokenize(content))
+        }
+    )
+
+def apply_search(query, search, fields=(Post.title, Post.content, Post.summary)):
+    """
+    为文章查询添加检索条件
+
+    Args:
+        query: Post 查询对象
+        search (str): 已清洗的查询串
+        fields (tuple): 回退到 LIKE 时匹配的字段
+
+    Returns:
+        tuple: (新的查询对象, 相关度排序表达式或None)
+    """
+    dialect = _dialect()
+    if current_app.config.get('SEARCH_FULLTEXT', True) and is_search_index_ready():
+        if dialect == 'sqlite':
+            match = build_match_expression(search)
+            if match:
+                weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+                hits = text(
+                    f"SELECT rowid AS post_id, bm25({FTS_TABLE}, {weights}) AS score "
+                    f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+                ).bindparams(match=match).columns(
+                    post_id=db.Integer, score=db.Float
+                ).subquery('search_hits')
+                query = query.join(hits, Post.id == hits.c.post_id)
+                # bm25 越小越相关
+                return query, hits.c.score.asc()
+        elif dialect == 'mysql':
+            terms = ' '.join(f'+"{token}"' for token in _TOKEN_RE.findall(search))
+            if terms:
+                match_sql = "MATCH (posts.title, posts.summary, posts.content) AGAINST ({} IN BOOLEAN MODE)"
+                query = query.filter(text(match_sql.format(':terms')).bindparams(terms=terms))
+                return query, desc(text(match_sql.format(':rank_terms')).bindparams(rank_terms=terms))
+
+    query = query.filter(or_(*[field.contains(search) for field in fields]))
+    return query, None
+
+def _text_changed(target):
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in ('title', 'summary', 'content'))
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+def _sync_post_index(mapper, connection, target):
+    """文章写入时在同一事务内更新 SQLite 检索索引，只改计数等字段时跳过"""
+    if connection.dialect.name != 'sqlite' or not _probe_index(connection):
+        return
+    if not _text_changed(target):
+        return
+    _index_row(connection, target.id, target.title, target.summary, target.content)
+
+@event.listens_for(Post, 'after_delete')
+def _remove_post_index(mapper, connection, target):
+    """文章删除时移除检索索引"""
+    if connection.dialect.name != 'sqlite' or not _probe_index(connection):
+        return
+    connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': target.id})
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量序列化工具函数
+列表接口一次性加载作者、标签、分类，避免逐条惰性加载产生的N+1查询
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from models import db, User, Comment, Tag, Category, Like, Favorite, post_tags, post_categories
+
+def load_authors(posts):
+    """
+    批量加载文章作者
+
+    Args:
+        posts (list): 文章对象列表
+
+    Returns:
+        dict: 作者ID到用户对象的映射
+    """
+    author_ids = {post.author_id for post in posts}
+    if not author_ids:
+        return {}
+    users = User.query.filter(User.id.in_(author_ids)).all()
+    return {user.id: user for user in users}
+
+def _load_related(post_ids, model, association, column):
+    """按关联表批量加载多对多对象，返回文章ID到对象列表的映射"""
+    related = defaultdict(list)
+    if not post_ids:
+        return related
+    rows = db.session.query(association.c.post_id, model).join(
+        model, model.id == column
+    ).filter(association.c.post_id.in_(post_ids)).all()
+    for post_id, obj in rows:
+        related[post_id].append(obj)
+    return related
+
+def load_tags(post_ids):
+    """
+    批量加载文章标签
+
+    Args:
+        post_ids (list): 文章ID列表
+
+    Returns:
+        dict: 文章ID到标签列表的映射
+    """
+    return _load_related(post_ids, Tag, post_tags, post_tags.c.tag_id)
+
+def load_categories(post_ids):
+    """
+    批量加载文章分类
+
+    Args:
+        post_ids (list): 文章ID列表
+
+    Returns:
+        dict: 文章ID到分类列表的映射
+    """
+    return _load_related(post_ids, Category, post_categories, post_categories.c.category_id)
+
+def serialize_posts(posts, include_content=False):
+    """
+    批量序列化文章列表
+
+    与逐条调用 Post.to_dict 输出相同的结构，但作者、标签、分类
+    各只需一次查询，总查询数与页大小无关
+
+    Args:
+        posts (list): 文章对象列表
+        include_content (bool): 是否包含正文
+
+    Returns:
+        list: 文章字典列表，顺序与输入一致
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    authors = load_authors(posts)
+    tags = load_tags(post_ids)
+    categories = load_categories(post_ids)
+
+    return [
+        post.to_dict(
+            include_content=include_content,
+            author=authors[post.author_id],
+            tags=tags[post.id],
+            categories=categories[post.id]
+        )
+        for post in posts
+    ]
+
+def load_user_interactions(user_id, post_ids):
+    """
+    查询用户对指定文章的点赞和收藏状态
+
+    只针对当前页的文章ID做IN查询，不加载用户的全部历史记录
+
+    Args:
+        user_id (int): 用户ID
+        post_ids (list): 文章ID列表
+
+    Returns:
+        tuple: (已点赞文章ID集合, 已收藏文章ID集合)
+    """
+    if not user_id or not post_ids:
+        return set(), set()
+
+    liked = db.session.query(Like.post_id).filter(
+        Like.user_id == user_id,
+        Like.post_id.in_(post_ids)
+    ).all()
+    favorited = db.session.query(Favorite.post_id).filter(
+        Favorite.user_id == user_id,
+        Favorite.post_id.in_(post_ids)
+    ).all()
+    return {row.post_id for row in liked}, {row.post_id for row in favorited}
+
+def _supports_window_functions():
+    """ROW_NUMBER() 需要 SQLite 3.25+、MySQL 8.0+ 或 MariaDB 10.2+"""
+    dialect = db.engine.dialect
+    version = dialect.server_version_info or ()
+    if dialect.name == 'sqlite':
+        return version >= (3, 25)
+    if dialect.name == 'mysql':
+        return version >= ((10, 2) if getattr(dialect, 'is_mariadb', False) else (8, 0))
+    return True
+
+def load_replies(parent_ids, limit=5):
+    """
+    批量加载每条评论的前若干条已批准回复
+
+    支持窗口函数时用 ROW_NUMBER() 一次查询取回每个父评论的前 limit 条；
+    否则按父评论ID做一次IN查询后在内存中截取
+
+    Args:
+        parent_ids (list): 父评论ID列表
+        limit (int): 每条评论最多返回的回复数
+
+    Returns:
+        dict: 父评论ID到回复列表的映射，回复按时间正序
+    """
+    replies = defaultdict(list)
+    if not parent_ids or limit <= 0:
+        return replies
+
+    order = (Comment.created_at.asc(), Comment.id.asc())
+    if _supports_window_functions():
+        row_number = func.row_number().over(
+            partition_by=Comment.parent_id, order_by=order
+        ).label('rn')
+        ranked = db.session.query(Comment, row_number).filter(
+            Comment.parent_id.in_(parent_ids),
+            Comment.status == 'approved'
+        ).subquery()
+        reply = aliased(Comment, ranked)
+        rows = db.session.query(reply).filter(ranked.c.rn <= limit).order_by(
+            ranked.c.parent_id, ranked.c.created_at, ranked.c.id
+        ).all()
+    else:
+        rows = Comment.query.filter(
+            Comment.parent_id.in_(parent_ids),
+            Comment.status == 'approved'
+        ).order_by(Comment.parent_id, *order).all()
+
+    for comment in rows:
+        if len(replies[comment.parent_id]) < limit:
+            replies[comment.parent_id].append(comment)
+    return replies
+
+def serialize_comments(comments, replies_per_comment=5):
+    """
+    批量序列化评论树
+
+    一页顶级评论、它们的前几条回复以及涉及的所有作者各只需一次查询
+
+    Args:
+        comments (list): 顶级评论对象列表
+        replies_per_comment (int): 每条评论附带的回复数，0表示不附带
+
+    Returns:
+        list: 评论字典列表，顺序与输入一致
+    """
+    comments = list(comments)
+    if not comments:
+        return []
+
+    replies = load_replies([comment.id for comment in comments], replies_per_comment)
+    authors = load_authors(comments + [reply for items in replies.values() for reply in items])
+
+    def to_dict(comment, children=None):
+        return comment.to_dict(
+            include_replies=children is not None,
+            author=authors.get(comment.author_id),
+            replies=[to_dict(reply) for reply in children] if children is not None else None
+        )
+
+    return [
+        to_dict(comment, replies[comment.id] if replies_per_comment > 0 else None)
+        for comment in comments
+    ]
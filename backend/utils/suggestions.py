@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索建议自动补全索引
+已发布文章标题和标签名保存在内存中的有序前缀数组里，按浏览量/文章数排序
+返回前k条建议，查询时不访问数据库；本进程内的文章和标签写入提交后增量更新。
+索引是每个进程各自一份，其他worker进程的写入看不到，因此后台线程每隔
+SUGGESTION_REFRESH_INTERVAL 秒全量重建一次，进程间的差异最多持续一个间隔
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Post, Tag
+from utils.process_pool import is_pool_worker
+
+logger = logging.getLogger(__name__)
+
+_CJK_RE = re.compile(r'[一-龥]')
+
+class SuggestionIndex:
+    """标题/标签前缀索引"""
+
+    def __init__(self, max_key_length=32, scan_limit=5000):
+        # 每个键截断到max_key_length，更长的查询在候选上再做子串校验
+        self.max_key_length = max_key_length
+        # 单次查询最多扫描的键数，保证短前缀的查询耗时有上界
+        self.scan_limit = scan_limit
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._keys = []
+        self._built = False
+        self.app = None
+        self.refresh_interval = 300
+        self._thread = None
+
+    def init_app(self, app):
+        """读取配置并启动定期重建线程"""
+        self.app = app
+        self.refresh_interval = app.config.get('SUGGESTION_REFRESH_INTERVAL', 300)
+        if self.refresh_interval > 0 and self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='suggestion-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            with self.app.app_context():
+                try:
+                    self.build()
+                except Exception as e:
+                    logger.warning(f"Failed to refresh suggestion index: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    @property
+    def built(self):
+        return self._built
+
+    def _index_keys(self, text):
+        """单词开头和每个中文字符处各生成一个键，以支持词中/字中匹配"""
+        lowered = (text or '').lower()
+        keys = set()
+        for i, ch in enumerate(lowered):
+            word_start = ch.isalnum() and (i == 0 or not lowered[i - 1].isalnum())
+            if word_start or _CJK_RE.match(ch):
+                keys.add(lowered[i:i + self.max_key_length])
+        return keys
+
+    def build(self):
+        """从数据库全量构建索引"""
+        entries = {}
+        posts = db.session.query(
+            Post.id, Post.title, Post.slug, Post.view_count
+        ).filter(Post.status == 'published').all()
+        for post in posts:
+            entries[('post', post.id)] = {
+                'text': post.title, 'slug': post.slug, 'weight': post.view_count or 0
+            }
+        tags = db.session.query(Tag.id, Tag.name, Tag.slug, Tag.post_count).all()
+        for tag in tags:
+            entries[('tag', tag.id)] = {
+                'text': tag.name, 'slug': tag.slug, 'weight': tag.post_count or 0
+            }
+
+        keys = []
+        for (kind, entry_id), entry in entries.items():
+            for key in self._index_keys(entry['text']):
+                keys.append((key, kind, entry_id))
+        keys.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._built = True
+        logger.info(f"Suggestion index built: {len(entries)} entries, {len(keys)} keys")
+
+    def upsert(self, kind, entry_id, text, slug, weight):
+        """新增或更新一条建议"""
+        with self._lock:
+            entry = self._entries.get((kind, entry_id))
+            if entry and entry['text'] == text:
+                # 只有热度或slug变化时不需要重建键
+                entry['slug'] = slug
+                entry['weight'] = weight or 0
+                return
+            self._remove_keys(kind, entry_id)
+            self._entries[(kind, entry_id)] = {'text': text, 'slug': slug, 'weight': weight or 0}
+            for key in self._index_keys(text):
+                insort(self._keys, (key, kind, entry_id))
+
+    def remove(self, kind, entry_id):
+        """删除一条建议"""
+        with self._lock:
+            self._remove_keys(kind, entry_id)
+            self._entries.pop((kind, entry_id), None)
+
+    def add_weight(self, kind, deltas):
+        """按ID累加热度，如浏览量写回后同步"""
+        with self._lock:
+            for entry_id, delta in deltas.items():
+                entry = self._entries.get((kind, entry_id))
+                if entry:
+                    entry['weight'] += delta
+
+    def _remove_keys(self, kind, entry_id):
+        entry = self._entries.get((kind, entry_id))
+        if not entry:
+            return
+        for key in self._index_keys(entry['text']):
+            item = (key, kind, entry_id)
+            i = bisect_left(self._keys, item)
+            if i < len(self._keys) and self._keys[i] == item:
+                del self._keys[i]
+
+    def suggest(self, query, limit=5):
+        """
+        获取前缀匹配的建议
+
+        Args:
+            query (str): 已清洗的查询串
+            limit (int): 每种类型返回的最大条数
+
+        Returns:
+            list: 文章建议在前、标签建议在后，各自按热度降序
+        """
+        needle = (query or '').lower()
+        if not needle:
+            return []
+        prefix = needle[:self.max_key_length]
+
+        matched = {'post': set(), 'tag': set()}
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), i + self.scan_limit)
+            while i < end:
+                key, kind, entry_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                matched[kind].add(entry_id)
+                i += 1
+
+            suggestions = []
+            for kind in ('post', 'tag'):
+                candidates = []
+                for entry_id in matched[kind]:
+                    entry = self._entries[(kind, entry_id)]
+                    if len(needle) > len(prefix) and needle not in entry['text'].lower():
+                        continue
+                    candidates.append((entry['weight'], entry_id, entry))
+                for weight, entry_id, entry in heapq.nlargest(limit, candidates, key=lambda c: (c[0], -c[1])):
+                    suggestions.append({
+                        'type': kind,
+                        'text': entry['text'],
+                        'slug': entry['slug'],
+                        'id': entry_id
+                    })
+        return suggestions
+
+suggestion_index = SuggestionIndex()
+
+def _pending(session):
+    return session.info.setdefault('suggestion_changes', {})
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """记录本事务中变更的文章和标签，提交后再更新索引"""
+    if not suggestion_index.built:
+        return
+    pending = _pending(session)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Post):
+            if obj.status == 'published':
+                pending[('post', obj.id)] = (obj.title, obj.slug, obj.view_count)
+            else:
+                pending[('post', obj.id)] = None
+        elif isinstance(obj, Tag):
+            pending[('tag', obj.id)] = (obj.name, obj.slug, obj.post_count)
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            pending[('post', obj.id)] = None
+        elif isinstance(obj, Tag):
+            pending[('tag', obj.id)] = None
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    changes = session.info.pop('suggestion_changes', None)
+    if not changes:
+        return
+    for (kind, entry_id), value in changes.items():
+        if value is None:
+            suggestion_index.remove(kind, entry_id)
+        else:
+            suggestion_index.upsert(kind, entry_id, *value)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('suggestion_changes', None)
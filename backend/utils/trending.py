@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热门文章排行
+按时间窗口内的浏览、点赞、评论、收藏计算互动分，再按发布时长衰减
+（score = 互动分 / (小时数 + 2) ^ gravity），后台线程定期重算排行并保存快照，
+/popular 只需读取排好序的列表前 k 项
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from models import db, Post, Like, Comment, Favorite, PostViewRollup
+from utils.view_rollup import unrolled_view_counts
+from utils.process_pool import is_pool_worker
+
+logger = logging.getLogger(__name__)
+
+# 各类互动的权重
+WEIGHTS = {'views': 1.0, 'likes': 5.0, 'comments': 10.0, 'favorites': 8.0}
+
+# 统计窗口，None表示全部历史
+PERIODS = {'week': 7, 'month': 30, 'all': None}
+
+def _naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def trending_score(engagement, published_at, now, gravity=1.8):
+    """
+    计算时间衰减后的热度分
+
+    Args:
+        engagement (float): 加权互动分
+        published_at (datetime): 发布时间
+        now (datetime): 当前时间（UTC，不带时区）
+        gravity (float): 衰减指数，越大越偏向新文章
+    """
+    age_hours = max((now - _naive_utc(published_at)).total_seconds() / 3600, 0) if published_at else 0
+    return engagement / ((age_hours + 2) ** gravity)
+
+class TrendingRanking:
+    """按统计窗口预计算的热门排行"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.gravity = 1.8
+        self.size = 200
+        self.refresh_interval = 300
+        self.snapshot_path = None
+        self.rankings = {}
+        self.generated_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.gravity = app.config.get('TRENDING_GRAVITY', 1.8)
+        self.size = app.config.get('TRENDING_SIZE', 200)
+        self.refresh_interval = app.config.get('TRENDING_REFRESH_INTERVAL', 300)
+        self.snapshot_path = app.config.get('TRENDING_SNAPSHOT_PATH')
+        self.load_snapshot()
+        if self.refresh_interval > 0 and self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='trending-refresh', daemon=True)
+            self._thread.start()
+
+    def top(self, period, limit):
+        """
+        读取排行前 limit 篇文章ID
+
+        尚无排行时（首次启动且没有快照）同步计算一次
+        """
+        if self.generated_at is None and self.app is not None:
+            self.refresh()
+        with self._lock:
+            ranking = self.rankings.get(period, [])
+            return [post_id for post_id, _ in ranking[:limit]]
+
+    def refresh(self):
+        """重新计算所有窗口的排行，并写入快照"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self.app.app_context():
+            try:
+                rankings = {period: self._compute(now, days) for period, days in PERIODS.items()}
+            finally:
+                db.session.remove()
+        with self._lock:
+            self.rankings = rankings
+            self.generated_at = now
+        self.save_snapshot()
+        return rankings
+
+    def _compute(self, now, days):
+        posts = db.session.query(
+            Post.id, Post.published_at, Post.created_at,
+            Post.view_count, Post.like_count, Post.comment_count, Post.favorite_count
+        ).filter(Post.status == 'published').all()
+
+        if days is None:
+            counts = {
+                row.id: {
+                    'views': row.view_count or 0,
+                    'likes': row.like_count or 0,
+                    'comments': row.comment_count or 0,
+                    'favorites': row.favorite_count or 0
+                }
+                for row in posts
+            }
+        else:
+            counts = self._window_counts(now - timedelta(days=days))
+
+        scored = []
+        for row in posts:
+            engagement = sum(WEIGHTS[k] * v for k, v in counts.get(row.id, {}).items())
+            if engagement <= 0:
+                continue
+            score = trending_score(engagement, row.published_at or row.created_at, now, self.gravity)
+            scored.append((row.id, score))
+        scored.sort(key=lambda item: (-item[1], -item[0]))
+        return scored[:self.size]
+
+    def _window_counts(self, since):
+        """
+        窗口内各文章的互动次数
+
+        浏览量取自按天汇总的浏览桶（由 rollup-views 任务写入），
+        加上检查点之后尚未汇总的原始浏览记录，汇总任务滞后时排行不会缺少近期浏览
+        """
+        counts = {}
+
+        def collect(kind, rows):
+            for post_id, n in rows:
+                if post_id is not None:
+                    counts.setdefault(post_id, {})[kind] = n
+
+        day_start = since.replace(hour=0, minute=0, second=0, microsecond=0)
+        collect('views', db.session.query(PostViewRollup.post_id, func.sum(PostViewRollup.views)).filter(
+            PostViewRollup.granularity == 'day',
+            PostViewRollup.bucket_start >= day_start
+        ).group_by(PostViewRollup.post_id))
+        for post_id, n in unrolled_view_counts(since).items():
+            views = counts.setdefault(post_id, {})
+            views['views'] = views.get('views', 0) + n
+        collect('likes', db.session.query(Like.post_id, func.count(Like.id)).filter(
+            Like.post_id.isnot(None),
+            Like.created_at >= since
+        ).group_by(Like.post_id))
+        collect('comments', db.session.query(Comment.post_id, func.count(Comment.id)).filter(
+            Comment.status == 'approved',
+            Comment.created_at >= since
+        ).group_by(Comment.post_id))
+        collect('favorites', db.session.query(Favorite.post_id, func.count(Favorite.id)).filter(
+            Favorite.created_at >= since
+        ).group_by(Favorite.post_id))
+        return counts
+
+    def load_snapshot(self):
+        """启动时读取上次保存的排行，过期快照同样可用，随后由后台线程刷新"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rankings = {period: [tuple(item) for item in items] for period, items in data['rankings'].items()}
+            generated_at = datetime.fromisoformat(data['generated_at'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load trending snapshot: {str(e)}")
+            return False
+        with self._lock:
+            self.rankings = rankings
+            self.generated_at = generated_at
+        return True
+
+    def save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            data = {
+                'generated_at': self.generated_at.isoformat(),
+                'rankings': self.rankings
+            }
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Failed to save trending snapshot: {str(e)}")
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to refresh trending ranking: {str(e)}")
+
+trending = TrendingRanking()
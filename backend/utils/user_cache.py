@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JWT身份解析的用户缓存
+user_lookup_loader 每个认证请求都会调用一次，结果由 flask_jwt_extended 保存在请求上下文中
+（路由里用 current_user 读取，同一请求不再查询）；跨请求的用户快照保存在进程内的限长、短TTL缓存里。
+用户资料、密码、状态等经ORM修改并提交后，本进程的缓存项立即失效，其他进程最多在TTL后更新
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User
+
+class UserSnapshot:
+    """用户只读快照，字段与 User 同名；计数等频繁变化的字段不在其中，需要修改用户时应按ID加载ORM对象"""
+
+    FIELDS = ('id', 'username', 'email', 'nickname', 'avatar', 'is_active', 'is_verified', 'is_admin')
+    __slots__ = FIELDS
+
+    def __init__(self, row):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(row, field))
+
+    def to_dict(self, include_email=False):
+        """快照中已有字段的公开资料，格式与 User.to_dict 的同名字段一致"""
+        data = {
+            'id': self.id,
+            'username': self.username,
+            'nickname': self.nickname or self.username,
+            'avatar': self.avatar,
+            'is_verified': self.is_verified
+        }
+        if include_email:
+            data['email'] = self.email
+        return data
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+class UserCache:
+    """按用户ID缓存 UserSnapshot，超过条数时淘汰最久未使用的项"""
+
+    def __init__(self, app=None):
+        self.ttl = 30
+        self.max_entries = 10000
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 30)
+        self.max_entries = app.config.get('USER_CACHE_SIZE', 10000)
+
+    def get(self, user_id):
+        """
+        获取用户快照，缓存未命中时只查询快照需要的列
+
+        Returns:
+            UserSnapshot: 用户不存在时返回None（不缓存）
+        """
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item and item[0] > now:
+                self._entries.move_to_end(user_id)
+                return item[1]
+
+        columns = [getattr(User, field) for field in UserSnapshot.FIELDS]
+        row = db.session.query(*columns).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(row)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, snapshot)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    user_ids = session.info.setdefault('user_cache_ids', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            user_ids.add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    user_ids = session.info.pop('user_cache_ids', None)
+    if user_ids:
+        user_cache.invalidate(*user_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('user_cache_ids', None)
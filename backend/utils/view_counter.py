@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章浏览量写缓冲
+请求路径只在内存（或Redis）中累加浏览次数，由后台线程按时间间隔或
+累计阈值批量执行 UPDATE ... SET view_count = view_count + n 写回数据库
+"""
+
+import atexit
+import logging
+import threading
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import bindparam, update
+
+from models import db, Post
+from utils.process_pool import is_pool_worker
+
+try:
+    import redis
+except ImportError:  # Redis为可选依赖
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryCounterStore:
+    """进程内计数存储"""
+
+    def __init__(self):
+        self._counts = defaultdict(int)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def incr(self, post_id, n=1):
+        """累加计数，返回全部待写入的浏览次数"""
+        with self._lock:
+            self._counts[post_id] += n
+            self._total += n
+            return self._total
+
+    def get(self, post_id):
+        with self._lock:
+            return self._counts.get(post_id, 0)
+
+    def drain(self):
+        """取出并清空全部待写入计数"""
+        with self._lock:
+            counts = dict(self._counts)
+            self._counts.clear()
+            self._total = 0
+        return counts
+
+class RedisCounterStore:
+    """基于Redis哈希的共享计数存储，多个worker进程共用同一缓冲；待写入的总浏览次数另存一个键"""
+
+    def __init__(self, url, key='blog:view_counts'):
+        self._redis = redis.Redis.from_url(url)
+        self._key = key
+        self._total_key = f"{key}:total"
+
+    def incr(self, post_id, n=1):
+        """累加计数，返回全部待写入的浏览次数（MULTI/EXEC中与哈希一起更新）"""
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self._key, post_id, n)
+        pipe.incrby(self._total_key, n)
+        return pipe.execute()[1]
+
+    def get(self, post_id):
+        return int(self._redis.hget(self._key, post_id) or 0)
+
+    def drain(self):
+        """原子地把当前哈希改名后读出，避免与并发累加相互覆盖"""
+        tmp_key = f"{self._key}:flush:{uuid.uuid4().hex}"
+        try:
+            self._redis.rename(self._key, tmp_key)
+        except redis.ResponseError:
+            # 键不存在，没有待写入的计数
+            return {}
+        pipe = self._redis.pipeline()
+        pipe.hgetall(tmp_key)
+        pipe.delete(tmp_key)
+        raw = pipe.execute()[0]
+        counts = {int(k): int(v) for k, v in raw.items()}
+        # 只扣除取出的部分，改名之后新累加的计数仍计入总数
+        self._redis.decrby(self._total_key, sum(counts.values()))
+        return counts
+
+class ViewCounter:
+    """浏览量写缓冲，聚合每篇文章的增量后批量写回"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.store = MemoryCounterStore()
+        self.flush_interval = 10
+        self.flush_threshold = 500
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置并启动后台写回线程"""
+        self.app = app
+        self.flush_interval = app.config.get('VIEW_COUNT_FLUSH_INTERVAL', 10)
+        self.flush_threshold = app.config.get('VIEW_COUNT_FLUSH_THRESHOLD', 500)
+
+        if app.config.get('VIEW_COUNT_BACKEND') == 'redis':
+            url = app.config.get('VIEW_COUNT_REDIS_URL')
+            if redis is None or not url:
+                logger.warning("Redis view counter backend unavailable, falling back to memory")
+            else:
+                self.store = RedisCounterStore(url)
+
+        if self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def on_flush(self, listener):
+        """注册写回回调，参数为 {post_id: 增量}，在写回事务提交后调用"""
+        self._listeners.append(listener)
+        return listener
+
+    def increment(self, post_id, n=1):
+        """记录一次浏览，达到阈值时唤醒写回线程"""
+        pending = self.store.incr(post_id, n)
+        if pending >= self.flush_threshold:
+            self._wakeup.set()
+
+    def pending(self, post_id):
+        """获取尚未写回的浏览增量"""
+        return self.store.get(post_id)
+
+    def flush(self):
+        """
+        把缓冲中的浏览增量写回数据库
+
+        Returns:
+            int: 本次写回的文章数
+        """
+        with self._flush_lock:
+            counts = self.store.drain()
+            if not counts:
+                return 0
+            if self.app is None:
+                logger.warning("View counter is not bound to an app, dropping %d posts", len(counts))
+                return 0
+            with self.app.app_context():
+                try:
+                    self._write(counts)
+                except Exception as e:
+                    db.session.rollback()
+                    # 写入失败时放回缓冲，等待下次重试
+                    for post_id, n in counts.items():
+                        self.store.incr(post_id, n)
+                    logger.error(f"Failed to flush view counts: {str(e)}")
+                    return 0
+                for listener in self._listeners:
+                    try:
+                        listener(counts)
+                    except Exception as e:
+                        logger.error(f"View count flush listener failed: {str(e)}")
+            return len(counts)
+
+    def _write(self, counts):
+        """单条语句批量执行原子自增"""
+        posts = Post.__table__
+        stmt = update(posts).where(
+            posts.c.id == bindparam('b_post_id')
+        ).values(
+            view_count=posts.c.view_count + bindparam('b_delta')
+        )
+        db.session.execute(stmt, [
+            {'b_post_id': post_id, 'b_delta': n} for post_id, n in counts.items()
+        ])
+        db.session.commit()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+view_counter = ViewCounter()
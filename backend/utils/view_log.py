@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览日志异步写入管道
+请求路径把精简的浏览记录放入有界队列，后台线程按批次 executemany 写入
+view_logs 表；队列已满时直接丢弃并计数，不阻塞请求
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from queue import Queue, Empty, Full
+
+from sqlalchemy import insert
+
+from models import db, ViewLog
+from utils.process_pool import is_pool_worker
+
+logger = logging.getLogger(__name__)
+
+class ViewLogPipeline:
+    """浏览日志批量写入管道"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = None
+        self.batch_size = 200
+        self.flush_interval = 2.0
+        self._thread = None
+        self._flush_lock = threading.Lock()
+        self._listeners = []
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置并启动后台写入线程"""
+        self.app = app
+        self.batch_size = app.config.get('VIEW_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('VIEW_LOG_FLUSH_INTERVAL', 2.0)
+        self.queue = Queue(maxsize=app.config.get('VIEW_LOG_QUEUE_SIZE', 10000))
+
+        if self._thread is None and not is_pool_worker():
+            self._thread = threading.Thread(target=self._run, name='view-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def on_write(self, listener):
+        """注册写入回调，参数为本批写入的记录列表，在事务提交后调用"""
+        self._listeners.append(listener)
+        return listener
+
+    def record(self, post_id, user_id=None, ip_address=None, user_agent=None, referer=None, viewed_at=None):
+        """
+        记录一次浏览，不访问数据库
+
+        Returns:
+            bool: 是否成功入队，队列满时返回False
+        """
+        if self.queue is None:
+            return False
+        item = {
+            'post_id': post_id,
+            'user_id': user_id,
+            'ip_address': (ip_address or '')[:45] or None,
+            'user_agent': user_agent or None,
+            'referer': (referer or '')[:500] or None,
+            'viewed_at': viewed_at or datetime.now(timezone.utc)
+        }
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self._incr('dropped')
+            return False
+        self._incr('enqueued')
+        return True
+
+    def stats(self):
+        """获取管道运行指标"""
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['queue_size'] = self.queue.qsize() if self.queue else 0
+        data['queue_capacity'] = self.queue.maxsize if self.queue else 0
+        return data
+
+    def flush(self):
+        """立即写入队列中的全部记录，用于退出前收尾"""
+        total = 0
+        while True:
+            batch = self._take(self.batch_size, timeout=0)
+            if not batch:
+                return total
+            self._write(batch)
+            total += len(batch)
+
+    def _incr(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _take(self, limit, timeout):
+        """从队列取出最多limit条记录，最多等待timeout秒凑批"""
+        batch = []
+        if self.queue is None:
+            return batch
+        deadline = time.monotonic() + timeout
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        with self._flush_lock, self.app.app_context():
+            try:
+                db.session.execute(insert(ViewLog.__table__), batch)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._incr('failed', len(batch))
+                logger.error(f"Failed to write view logs: {str(e)}")
+                return
+            self._incr('written', len(batch))
+            self._incr('batches')
+            for listener in self._listeners:
+                try:
+                    listener(batch)
+                except Exception as e:
+                    logger.error(f"View log write listener failed: {str(e)}")
+
+    def _run(self):
+        while True:
+            # 阻塞等待第一条记录，再在flush_interval内尽量凑满一批
+            try:
+                first = self.queue.get()
+            except Exception:
+                continue
+            batch = [first] + self._take(self.batch_size - 1, self.flush_interval)
+            self._write(batch)
+
+view_log_pipeline = ViewLogPipeline()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览日志汇总
+把原始浏览记录按文章压缩成小时桶和天桶（浏览次数 + 独立用户/IP的HyperLogLog草图），
+趋势查询只读汇总表；已汇总且超过保留期的原始记录可以删除。
+多个worker的浏览日志批次提交顺序与ID顺序不一定一致，因此检查点是 (浏览时间, ID) 水位线，
+且只汇总浏览时间早于 当前时间 - 安全延迟 的记录，此前的批次都已提交
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update, tuple_, or_, and_
+
+from models import db, ViewLog, PostViewRollup, RollupCheckpoint
+from utils.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'view_logs'
+GRANULARITIES = ('hour', 'day')
+
+def bucket_start(value, granularity):
+    """把时间截断到所在桶的起点（UTC，不带时区）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class _Bucket:
+    """内存中累加的一个汇总桶"""
+
+    def __init__(self):
+        self.views = 0
+        self.users = HyperLogLog()
+        self.ips = HyperLogLog()
+
+    def add(self, row):
+        self.views += 1
+        if row.user_id is not None:
+            self.users.add(row.user_id)
+        if row.ip_address:
+            self.ips.add(row.ip_address)
+
+def _get_checkpoint():
+    checkpoint = db.session.get(RollupCheckpoint, CHECKPOINT_NAME)
+    if checkpoint is None:
+        checkpoint = RollupCheckpoint(name=CHECKPOINT_NAME, last_id=0)
+        db.session.add(checkpoint)
+        db.session.flush()
+    elif checkpoint.last_viewed_at is None and checkpoint.last_id:
+        # 旧版本只记录了ID：取已汇总记录中最晚的浏览时间作为水位线，保证不重复计数
+        checkpoint.last_viewed_at = db.session.query(db.func.max(ViewLog.viewed_at)).filter(
+            ViewLog.id <= checkpoint.last_id
+        ).scalar()
+        db.session.flush()
+    return checkpoint
+
+def _after_checkpoint(query, last_viewed_at, last_id):
+    """只保留 (浏览时间, ID) 在检查点之后的记录"""
+    if last_viewed_at is None:
+        return query
+    return query.filter(or_(
+        ViewLog.viewed_at > last_viewed_at,
+        and_(ViewLog.viewed_at == last_viewed_at, ViewLog.id > last_id)
+    ))
+
+def filter_unrolled(query):
+    """只保留尚未汇总进汇总表的浏览记录（只读，不创建检查点）"""
+    checkpoint = db.session.get(RollupCheckpoint, CHECKPOINT_NAME)
+    if checkpoint is None:
+        return query
+    if checkpoint.last_viewed_at is None:
+        return query.filter(ViewLog.id > (checkpoint.last_id or 0))
+    return _after_checkpoint(query, checkpoint.last_viewed_at, checkpoint.last_id)
+
+def unrolled_view_counts(since):
+    """
+    统计时间之后尚未汇总的浏览次数，汇总任务滞后或未运行时用于补足汇总表
+
+    Returns:
+        dict: {文章ID: 浏览次数}
+    """
+    query = db.session.query(ViewLog.post_id, db.func.count(ViewLog.id)).filter(ViewLog.viewed_at >= since)
+    return dict(filter_unrolled(query).group_by(ViewLog.post_id).all())
+
+def rollup_cutoff(safety_lag):
+    """可以安全汇总的浏览时间上界（UTC，不带时区）"""
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=safety_lag)
+
+def _merge_buckets(buckets):
+    """把内存中的桶合并进汇总表"""
+    keys = list(buckets)
+    existing = {}
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows = PostViewRollup.query.filter(tuple_(
+            PostViewRollup.post_id, PostViewRollup.granularity, PostViewRollup.bucket_start
+        ).in_(chunk)).all()
+        existing.update({(row.post_id, row.granularity, row.bucket_start): row for row in rows})
+
+    for key, bucket in buckets.items():
+        row = existing.get(key)
+        if row is None:
+            row = PostViewRollup(post_id=key[0], granularity=key[1], bucket_start=key[2], views=0)
+            db.session.add(row)
+        row.views = (row.views or 0) + bucket.views
+        row.users_hll = HyperLogLog.from_bytes(row.users_hll).merge(bucket.users).to_bytes()
+        row.ips_hll = HyperLogLog.from_bytes(row.ips_hll).merge(bucket.ips).to_bytes()
+
+def rollup_view_logs(batch_size=5000, safety_lag=300):
+    """
+    把尚未汇总的浏览记录合并进小时桶和天桶
+
+    按 (浏览时间, ID) 递增处理，每批一个事务并推进检查点；
+    检查点用条件更新防止两个任务同时运行时重复计数
+
+    Args:
+        batch_size (int): 每批处理的记录数
+        safety_lag (int): 安全延迟秒数，需大于浏览日志从记录到提交的最长耗时
+
+    Returns:
+        int: 本次汇总的浏览记录数
+    """
+    cutoff = rollup_cutoff(safety_lag)
+    total = 0
+    while True:
+        checkpoint = _get_checkpoint()
+        last_viewed_at, last_id = checkpoint.last_viewed_at, checkpoint.last_id
+        query = db.session.query(
+            ViewLog.id, ViewLog.post_id, ViewLog.user_id, ViewLog.ip_address, ViewLog.viewed_at
+        ).filter(ViewLog.viewed_at.isnot(None), ViewLog.viewed_at < cutoff)
+        rows = _after_checkpoint(query, last_viewed_at, last_id).order_by(
+            ViewLog.viewed_at, ViewLog.id
+        ).limit(batch_size).all()
+        if not rows:
+            db.session.commit()
+            return total
+
+        buckets = defaultdict(_Bucket)
+        for row in rows:
+            for granularity in GRANULARITIES:
+                buckets[(row.post_id, granularity, bucket_start(row.viewed_at, granularity))].add(row)
+        _merge_buckets(buckets)
+
+        advanced = db.session.execute(update(RollupCheckpoint.__table__).where(
+            RollupCheckpoint.name == CHECKPOINT_NAME,
+            RollupCheckpoint.last_id == last_id,
+            RollupCheckpoint.last_viewed_at.is_(None) if last_viewed_at is None
+            else RollupCheckpoint.last_viewed_at == last_viewed_at
+        ).values(
+            last_id=rows[-1].id,
+            last_viewed_at=rows[-1].viewed_at,
+            updated_at=datetime.now(timezone.utc)
+        )).rowcount
+        if not advanced:
+            db.session.rollback()
+            logger.warning("View log rollup checkpoint moved concurrently, stopping")
+            return total
+        db.session.commit()
+        total += len(rows)
+
+def purge_view_logs(retention_days, hourly_retention_days=None):
+    """
+    删除超过保留期且已汇总的原始浏览记录，以及过期的小时桶
+
+    原始记录只删除浏览时间早于检查点的部分，不会越过汇总进度
+
+    Args:
+        retention_days (int): 原始记录保留天数
+        hourly_retention_days (int): 小时桶保留天数，None表示不删除
+
+    Returns:
+        tuple: (删除的原始记录数, 删除的小时桶数)
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    last_viewed_at = _get_checkpoint().last_viewed_at
+    raw_deleted = 0
+    if last_viewed_at is not None:
+        raw_deleted = ViewLog.query.filter(
+            ViewLog.viewed_at < min(last_viewed_at, now - timedelta(days=retention_days))
+        ).delete(synchronize_session=False)
+
+    hourly_deleted = 0
+    if hourly_retention_days is not None:
+        hourly_deleted = PostViewRollup.query.filter(
+            PostViewRollup.granularity == 'hour',
+            PostViewRollup.bucket_start < now - timedelta(days=hourly_retention_days)
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return raw_deleted, hourly_deleted
+
+def query_trend(post_ids, start, end, granularity='day'):
+    """
+    从汇总表查询时间段内的浏览趋势
+
+    多篇文章的同一个桶合并计算：浏览次数相加，独立用户/IP合并草图后估计
+
+    Args:
+        post_ids (list): 文章ID列表
+        start (datetime): 起始时间（含）
+        end (datetime): 结束时间（不含）
+        granularity (str): hour 或 day
+
+    Returns:
+        dict: {'buckets': [...], 'totals': {...}, 'rolled_up_at': 最近汇总时间}
+    """
+    buckets = {}
+    total_views = 0
+    all_users = HyperLogLog()
+    all_ips = HyperLogLog()
+    if post_ids:
+        rows = PostViewRollup.query.filter(
+            PostViewRollup.post_id.in_(post_ids),
+            PostViewRollup.granularity == granularity,
+            PostViewRollup.bucket_start >= start,
+            PostViewRollup.bucket_start < end
+        ).order_by(PostViewRollup.bucket_start).all()
+        for row in rows:
+            views, users, ips = buckets.setdefault(row.bucket_start, [0, HyperLogLog(), HyperLogLog()])
+            buckets[row.bucket_start][0] = views + row.views
+            users.merge(HyperLogLog.from_bytes(row.users_hll))
+            ips.merge(HyperLogLog.from_bytes(row.ips_hll))
+            total_views += row.views
+
+    items = []
+    for start_at in sorted(buckets):
+        views, users, ips = buckets[start_at]
+        all_users.merge(users)
+        all_ips.merge(ips)
+        items.append({
+            'bucket': start_at.isoformat(),
+            'views': views,
+            'unique_users': users.count(),
+            'unique_ips': ips.count()
+        })
+
+    checkpoint = db.session.get(RollupCheckpoint, CHECKPOINT_NAME)
+    return {
+        'buckets': items,
+        'totals': {
+            'views': total_views,
+            'unique_users': all_users.count(),
+            'unique_ips': all_ips.count()
+        },
+        'rolled_up_at': checkpoint.updated_at.isoformat() if checkpoint and checkpoint.updated_at else None
+    }
@@ -16,6 +16,7 @@ CREATE TABLE IF NOT EXISTS users (
     followers_count INTEGER DEFAULT 0,
     following_count INTEGER DEFAULT 0,
     posts_count INTEGER DEFAULT 0,
+    unread_notifications_count INTEGER DEFAULT 0,
     is_active BOOLEAN DEFAULT TRUE,
     is_verified BOOLEAN DEFAULT FALSE,
     is_admin BOOLEAN DEFAULT FALSE,
@@ -35,6 +36,7 @@ CREATE TABLE IF NOT EXISTS posts (
     status VARCHAR(20) DEFAULT 'published',
     is_featured BOOLEAN DEFAULT FALSE,
     allow_comments BOOLEAN DEFAULT TRUE,
+    render_status VARCHAR(20) DEFAULT 'ready',
     view_count INTEGER DEFAULT 0,
     like_count INTEGER DEFAULT 0,
     comment_count INTEGER DEFAULT 0,
@@ -153,14 +155,70 @@ CREATE TABLE IF NOT EXISTS notifications (
     title VARCHAR(200) NOT NULL,
     message TEXT DEFAULT '',
     data TEXT DEFAULT '',
+    group_key VARCHAR(100) NULL,
+    actor_count INTEGER DEFAULT 1,
     is_read BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (actor_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
     FOREIGN KEY (comment_id) REFERENCES comments(id) ON DELETE CASCADE
 );
 
+-- 关注者通知扇出任务表（记录进度，重启后续传）
+CREATE TABLE IF NOT EXISTS notification_fanout_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    post_id INTEGER NULL,
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    message TEXT DEFAULT '',
+    last_follower_id INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+);
+
+-- 合并通知触发者表（每位触发者只计数一次）
+CREATE TABLE IF NOT EXISTS notification_actors (
+    notification_id INTEGER NOT NULL,
+    actor_id INTEGER NOT NULL,
+    PRIMARY KEY (notification_id, actor_id),
+    FOREIGN KEY (notification_id) REFERENCES notifications(id) ON DELETE CASCADE,
+    FOREIGN KEY (actor_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 通知归档表（保留任务移入的已读旧通知）
+CREATE TABLE IF NOT EXISTS notification_archives (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    actor_id INTEGER NULL,
+    post_id INTEGER NULL,
+    actor_count INTEGER DEFAULT 1,
+    title VARCHAR(200) NOT NULL,
+    message TEXT DEFAULT '',
+    created_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 首页关注流表（推模式写入的关注作者文章）
+CREATE TABLE IF NOT EXISTS feed_entries (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    published_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, post_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- 浏览记录表
 CREATE TABLE IF NOT EXISTS view_logs (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -174,21 +232,72 @@ CREATE TABLE IF NOT EXISTS view_logs (
     FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
 );
 
+-- 作者统计物化表
+CREATE TABLE IF NOT EXISTS author_stats (
+    user_id INTEGER PRIMARY KEY,
+    total_posts INTEGER NOT NULL DEFAULT 0,
+    total_views INTEGER NOT NULL DEFAULT 0,
+    total_likes INTEGER NOT NULL DEFAULT 0,
+    total_comments INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 作者每日浏览量
+CREATE TABLE IF NOT EXISTS author_daily_views (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 浏览汇总（小时桶/天桶，独立用户和IP为HyperLogLog草图）
+CREATE TABLE IF NOT EXISTS post_view_rollups (
+    post_id INTEGER NOT NULL,
+    granularity VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    users_hll BLOB NULL,
+    ips_hll BLOB NULL,
+    PRIMARY KEY (post_id, granularity, bucket_start),
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS rollup_checkpoints (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    last_viewed_at TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_posts_status_created_at ON posts(status, created_at);
-CREATE INDEX IF NOT EXISTS idx_posts_author_id ON posts(author_id);
+CREATE INDEX IF NOT EXISTS idx_posts_status_published_at ON posts(status, published_at);
+CREATE INDEX IF NOT EXISTS idx_posts_status_view_count ON posts(status, view_count);
+CREATE INDEX IF NOT EXISTS idx_posts_status_like_count ON posts(status, like_count);
+CREATE INDEX IF NOT EXISTS idx_posts_status_comment_count ON posts(status, comment_count);
+CREATE INDEX IF NOT EXISTS idx_posts_author_status_published_at ON posts(author_id, status, published_at);
 CREATE INDEX IF NOT EXISTS idx_posts_slug ON posts(slug);
-CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id);
+CREATE INDEX IF NOT EXISTS idx_comments_post_parent_status_created_at ON comments(post_id, parent_id, status, created_at);
 CREATE INDEX IF NOT EXISTS idx_comments_author_id ON comments(author_id);
-CREATE INDEX IF NOT EXISTS idx_comments_parent_id ON comments(parent_id);
+CREATE INDEX IF NOT EXISTS idx_comments_parent_status_created_at ON comments(parent_id, status, created_at);
 CREATE INDEX IF NOT EXISTS idx_likes_user_id ON likes(user_id);
 CREATE INDEX IF NOT EXISTS idx_favorites_user_id ON favorites(user_id);
 CREATE INDEX IF NOT EXISTS idx_follows_follower_id ON follows(follower_id);
-CREATE INDEX IF NOT EXISTS idx_follows_followed_id ON follows(followed_id);
-CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
+CREATE INDEX IF NOT EXISTS idx_follows_followed_id_follower_id ON follows(followed_id, follower_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_updated_at ON notifications(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_is_read_updated_at ON notifications(user_id, is_read, updated_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_group_key ON notifications(user_id, group_key, is_read);
+CREATE INDEX IF NOT EXISTS idx_notifications_is_read_created_at ON notifications(is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_notification_fanout_jobs_status ON notification_fanout_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_notification_archives_user_id_created_at ON notification_archives(user_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications(created_at);
 CREATE INDEX IF NOT EXISTS idx_view_logs_post_id_viewed_at ON view_logs(post_id, viewed_at);
+CREATE INDEX IF NOT EXISTS idx_view_logs_viewed_at_id ON view_logs(viewed_at, id);
 CREATE INDEX IF NOT EXISTS idx_view_logs_user_id ON view_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_post_view_rollups_granularity_bucket ON post_view_rollups(granularity, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_feed_entries_user_published_at ON feed_entries(user_id, published_at, post_id);
 
 -- 创建触发器（用于SQLite自动更新时间戳）
 -- 注意：MySQL需要使用不同的语法
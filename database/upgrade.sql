@@ -0,0 +1,144 @@
+-- 博客系统数据库升级脚本
+-- 已有数据库按顺序执行对应段落；新建数据库直接使用 schema.sql 或 init-db
+-- 数据库: SQLite / MySQL兼容
+
+-- 文章异步渲染状态
+ALTER TABLE posts ADD COLUMN render_status VARCHAR(20) DEFAULT 'ready';
+
+-- 作者统计物化表（创建后执行 flask --app app rebuild-author-stats 回填）
+CREATE TABLE IF NOT EXISTS author_stats (
+    user_id INTEGER PRIMARY KEY,
+    total_posts INTEGER NOT NULL DEFAULT 0,
+    total_views INTEGER NOT NULL DEFAULT 0,
+    total_likes INTEGER NOT NULL DEFAULT 0,
+    total_comments INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS author_daily_views (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- 浏览汇总（创建后执行 flask --app app rollup-views 汇总已有浏览记录）
+CREATE TABLE IF NOT EXISTS post_view_rollups (
+    post_id INTEGER NOT NULL,
+    granularity VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    users_hll BLOB NULL,
+    ips_hll BLOB NULL,
+    PRIMARY KEY (post_id, granularity, bucket_start),
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS rollup_checkpoints (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_post_view_rollups_granularity_bucket ON post_view_rollups(granularity, bucket_start);
+
+-- 按实际查询形态建立的复合索引（过滤列在前、排序列在后），替换被其前缀覆盖的单列索引
+CREATE INDEX IF NOT EXISTS idx_posts_status_published_at ON posts(status, published_at);
+CREATE INDEX IF NOT EXISTS idx_posts_status_view_count ON posts(status, view_count);
+CREATE INDEX IF NOT EXISTS idx_posts_status_like_count ON posts(status, like_count);
+CREATE INDEX IF NOT EXISTS idx_posts_status_comment_count ON posts(status, comment_count);
+CREATE INDEX IF NOT EXISTS idx_comments_post_parent_status_created_at ON comments(post_id, parent_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_comments_parent_status_created_at ON comments(parent_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_created_at ON notifications(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_is_read_created_at ON notifications(user_id, is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_follows_followed_id_follower_id ON follows(followed_id, follower_id);
+-- MySQL 写作 DROP INDEX idx_comments_post_id ON comments; 以此类推
+DROP INDEX IF EXISTS idx_comments_post_id;
+DROP INDEX IF EXISTS idx_comments_parent_id;
+DROP INDEX IF EXISTS idx_notifications_user_id;
+DROP INDEX IF EXISTS idx_follows_followed_id;
+
+-- 用户未读通知计数
+ALTER TABLE users ADD COLUMN unread_notifications_count INTEGER DEFAULT 0;
+UPDATE users SET unread_notifications_count = (
+    SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.id AND notifications.is_read = 0
+);
+
+-- 通知合并
+ALTER TABLE notifications ADD COLUMN group_key VARCHAR(100) NULL;
+ALTER TABLE notifications ADD COLUMN actor_count INTEGER DEFAULT 1;
+ALTER TABLE notifications ADD COLUMN updated_at TIMESTAMP NULL;
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_group_key ON notifications(user_id, group_key, is_read);
+
+-- 通知保留与归档
+CREATE TABLE IF NOT EXISTS notification_archives (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type VARCHAR(50) NOT NULL,
+    actor_id INTEGER NULL,
+    post_id INTEGER NULL,
+    actor_count INTEGER DEFAULT 1,
+    title VARCHAR(200) NOT NULL,
+    message TEXT DEFAULT '',
+    created_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_is_read_created_at ON notifications(is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_notification_archives_user_id_created_at ON notification_archives(user_id, created_at);
+
+-- 首页关注流
+CREATE TABLE IF NOT EXISTS feed_entries (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    published_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, post_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_feed_entries_user_published_at ON feed_entries(user_id, published_at, post_id);
+CREATE INDEX IF NOT EXISTS idx_posts_author_status_published_at ON posts(author_id, status, published_at);
+DROP INDEX IF EXISTS idx_posts_author_id;
+
+-- 浏览汇总检查点改为 (浏览时间, ID) 水位线
+ALTER TABLE rollup_checkpoints ADD COLUMN last_viewed_at TIMESTAMP NULL;
+CREATE INDEX IF NOT EXISTS idx_view_logs_viewed_at_id ON view_logs(viewed_at, id);
+
+-- 合并通知按不同触发者计数
+CREATE TABLE IF NOT EXISTS notification_actors (
+    notification_id INTEGER NOT NULL,
+    actor_id INTEGER NOT NULL,
+    PRIMARY KEY (notification_id, actor_id),
+    FOREIGN KEY (notification_id) REFERENCES notifications(id) ON DELETE CASCADE,
+    FOREIGN KEY (actor_id) REFERENCES users(id) ON DELETE CASCADE
+);
+INSERT INTO notification_actors (notification_id, actor_id)
+    SELECT id, actor_id FROM notifications WHERE group_key IS NOT NULL AND actor_id IS NOT NULL AND is_read = 0;
+
+-- 通知扇出任务持久化
+CREATE TABLE IF NOT EXISTS notification_fanout_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id INTEGER NOT NULL,
+    post_id INTEGER NULL,
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    message TEXT DEFAULT '',
+    last_follower_id INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_notification_fanout_jobs_status ON notification_fanout_jobs(status);
+
+-- 通知列表按最近更新时间排序（合并通知更新 updated_at 后排到前面）
+UPDATE notifications SET updated_at = created_at WHERE updated_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_updated_at ON notifications(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_id_is_read_updated_at ON notifications(user_id, is_read, updated_at);
+DROP INDEX IF EXISTS idx_notifications_user_id_created_at;
+DROP INDEX IF EXISTS idx_notifications_user_id_is_read_created_at;